@@ -0,0 +1,79 @@
+from protocols.job import IR_EMITTER
+from scheduler import mono_ms
+
+
+class _Bucket:
+    def __init__(self, tokens: float, now: int):
+        self.tokens = tokens
+        self.updated = now
+
+
+class Admission:
+    """Admission control for requests that transmit.
+
+    - delay_ms() estimates how long new IR work would wait: the frame on
+      air (ctx["transports"]) plus the air time of everything the executor
+      still has queued for the emitter
+    - Above max_delay_ms a request is refused with 503 and a Retry-After
+      of the excess, so latency stays bounded instead of growing
+    - Every client (IP) has a token bucket of burst requests refilled at
+      rate_per_s; an empty bucket answers 429, so one busy client cannot
+      starve the others
+    """
+
+    def __init__(self, ctx: dict, max_delay_ms: int = 3000, rate_per_s: float = 5, burst: int = 10, max_clients: int = 16):
+        self._ctx = ctx
+        self.max_delay_ms = int(max_delay_ms)
+        self.rate = float(rate_per_s)
+        self.burst = max(1, int(burst))
+        self._max_clients = max(1, int(max_clients))
+        self._buckets = {}  # client -> _Bucket
+        self.rejected_busy = 0
+        self.rejected_rate = 0
+
+    def delay_ms(self, resource: str = IR_EMITTER) -> int:
+        delay = 0
+        transports = self._ctx.get("transports")
+        if transports is not None:
+            delay += max(0, transports.free_in_ms(resource))
+        executor = self._ctx.get("executor")
+        if executor is not None:
+            delay += executor.backlog_ms(resource)
+        return delay
+
+    def _bucket(self, client, now: int):
+        b = self._buckets.get(client)
+        if b is None:
+            if len(self._buckets) >= self._max_clients:
+                # Forget the client that has been quiet the longest
+                oldest = min(self._buckets, key=lambda c: self._buckets[c].updated)
+                del self._buckets[oldest]
+            b = self._buckets[client] = _Bucket(self.burst, now)
+            return b
+        b.tokens = min(self.burst, b.tokens + (now - b.updated) * self.rate / 1000)
+        b.updated = now
+        return b
+
+    def admit(self, client, cost_ms: int = 0, resource: str = IR_EMITTER):
+        """None when the request may proceed, else (status, payload)."""
+        now = mono_ms()
+        b = self._bucket(client, now)
+        if b.tokens < 1:
+            self.rejected_rate += 1
+            retry_s = int((1 - b.tokens) / self.rate) + 1 if self.rate > 0 else 60
+            return 429, {"error": "Too many requests from this client", "retry_after_s": retry_s}
+        over = self.delay_ms(resource) + cost_ms - self.max_delay_ms
+        if over > 0:
+            self.rejected_busy += 1
+            return 503, {"error": "Transmitter busy", "retry_after_s": over // 1000 + 1}
+        b.tokens -= 1
+        return None
+
+    def stats(self):
+        return {
+            "delay_ms": self.delay_ms(),
+            "max_delay_ms": self.max_delay_ms,
+            "rejected_busy": self.rejected_busy,
+            "rejected_rate": self.rejected_rate,
+            "clients": len(self._buckets),
+        }
@@ -0,0 +1,92 @@
+from executor import group_steps
+from protocols.dispatch import compile_command
+
+MAX_ITEMS = 32
+
+
+def compile_batch(ctx, items):
+    """Validate and compile a batch; returns (steps, jobs, None) or
+    (None, None, (status, error payload)) with the errors of all bad items.
+
+    Every item is compiled up front (devices looked up once), so nothing is
+    sent when any item is invalid. delay_ms defaults to 0 (as soon as the
+    transport is free); items with delay_ms 0 run together with the next one.
+    """
+    if not isinstance(items, list) or not items:
+        return None, None, (400, {"error": "'items' must be a non-empty list"})
+    if len(items) > MAX_ITEMS:
+        return None, None, (400, {"error": "At most %d items per batch" % MAX_ITEMS})
+    devices = ctx["devices"].data()
+    compiled = []
+    errors = []
+    status = 400
+    for i, it in enumerate(items):
+        if not isinstance(it, dict) or not it.get("device") or not it.get("command"):
+            errors.append({"index": i, "status": 400, "error": "Needs 'device' and 'command'"})
+            continue
+        options = None
+        try:
+            if it.get("repetitions") is not None:
+                options = {"repetitions": max(1, int(it.get("repetitions")))}
+            delay_ms = max(0, int(it.get("delay_ms") or 0))
+        except Exception:
+            errors.append({"index": i, "status": 400, "error": "Invalid 'repetitions' or 'delay_ms'"})
+            continue
+        st, job = compile_command(ctx, it.get("device"), it.get("command"), options, devices)
+        if st != 200:
+            err = job.get("error") if isinstance(job, dict) else job
+            errors.append({"index": i, "status": st, "error": err})
+            status = st if len(errors) == 1 else 400
+            continue
+        compiled.append((job, delay_ms))
+    if errors:
+        return None, None, (status, {"error": "Invalid batch", "items": errors})
+    compiled[-1] = (compiled[-1][0], 0)
+    return group_steps(compiled), [job for job, _ in compiled], None
+
+
+class BatchRun:
+    """Results of a batch running on the executor, as NDJSON lines.
+
+    The executor reports each transmitted job; poll() hands out the lines
+    gathered since the last call, ending with a summary once done is set.
+    """
+
+    def __init__(self, jobs):
+        self._index = dict((id(job), i) for i, job in enumerate(jobs))
+        self.total = len(jobs)
+        self.ok = 0
+        self.failed = 0
+        self.plan_id = None
+        self.done = False
+        self._lines = []
+
+    def on_result(self, job, status, payload):
+        if status == 200:
+            self.ok += 1
+        else:
+            self.failed += 1
+        self._lines.append({
+            "index": self._index.get(id(job)),
+            "device": job.device,
+            "command": job.command,
+            "status": status,
+            "payload": payload,
+        })
+
+    def on_done(self):
+        self._lines.append({
+            "done": True,
+            "plan_id": self.plan_id,
+            "ok": self.ok,
+            "failed": self.failed,
+            "skipped": self.total - self.ok - self.failed,
+        })
+        self.done = True
+
+    def pending(self) -> bool:
+        return bool(self._lines)
+
+    def poll(self):
+        lines, self._lines = self._lines, []
+        return lines
@@ -0,0 +1,119 @@
+from protocols.dispatch import compile_command, transmit
+from scheduler import mono_ms
+
+
+def _toggles(job) -> bool:
+    """True when the command has two different toggle variants (RC-5/RC-6)."""
+    frames = job.frames
+    return len(frames) > 1 and frames[0] is not None and frames[1] is not None and frames[0] != frames[1]
+
+
+class Coalescer:
+    """Merges rapid identical presses into one transmission.
+
+    - The first press of a device/command goes out right away
+    - Identical presses arriving within window_ms of the last transmission
+      are held back and merged: one transmission with the summed
+      repetitions (at most max_repetitions), window_ms after the first
+      merged press; repetitions beyond the cap are counted as capped
+    - Commands with two different toggle variants (RC-5/RC-6 style) are
+      never merged: one transmission carries one toggle value, which the
+      device reads as a single long press, so every press goes out on its
+      own
+    - tick()/next_due_ms() run from the server loop like the other services
+    """
+
+    def __init__(self, ctx: dict, window_ms: int = 250, max_repetitions: int = 16):
+        self._ctx = ctx
+        self.window_ms = int(window_ms)
+        self.max_repetitions = max(1, int(max_repetitions))
+        self._last = {}  # (device, command) -> mono ms of the last transmission
+        # (device, command) -> [due mono ms, repetitions, presses, capped repetitions]
+        self._pending = {}
+        self.merged = 0  # Presses absorbed into another transmission
+        self.capped = 0  # Repetitions cut off by max_repetitions
+        self.sends = 0  # Merged transmissions
+
+    def send(self, device: str, command: str, options=None):
+        """Send now, or queue/merge behind a recent identical send (202)."""
+        key = (device, command)
+        now = mono_ms()
+        last = self._last.get(key)
+        # Compiled for validation and the protocol's default repetitions
+        status, job = compile_command(self._ctx, device, command, options)
+        if status != 200:
+            return status, job
+        if self.window_ms <= 0 or _toggles(job) or (key not in self._pending and (last is None or now - last >= self.window_ms)):
+            result = transmit(self._ctx, job)
+            if result[0] in (200, 202):
+                if len(self._last) >= 32:  # Forget presses older than the window
+                    self._last = dict((k, t) for k, t in self._last.items() if now - t < self.window_ms)
+                self._last[key] = now
+            return result
+
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = [now + self.window_ms, 0, 0, 0]
+        else:
+            self.merged += 1
+        reps = entry[1] + job.reps
+        if reps > self.max_repetitions:
+            self.capped += reps - self.max_repetitions
+            entry[3] += reps - self.max_repetitions
+            reps = self.max_repetitions
+        entry[1] = reps
+        entry[2] += 1
+        # Air time scales with the repetitions (one frame plus gap each)
+        air_ms = (job.air_us * entry[1] // max(1, job.reps) + 999) // 1000
+        due_in = max(0, entry[0] - now)
+        return 202, {
+            "status": "coalesced",
+            "device": device,
+            "command": command,
+            "merged": entry[2],
+            "repetitions": entry[1],
+            "capped": entry[3],
+            "due_in_ms": due_in,
+            "air_time_ms": air_ms,
+            "eta_ms": due_in + air_ms,
+        }
+
+    def next_due_ms(self):
+        if not self._pending:
+            return None
+        now = mono_ms()
+        return max(0, min(e[0] for e in self._pending.values()) - now)
+
+    def tick(self):
+        if not self._pending:
+            return
+        now = mono_ms()
+        transports = self._ctx.get("transports")
+        for key, entry in list(self._pending.items()):
+            if entry[0] > now:
+                continue
+            device, command = key
+            status, job = compile_command(self._ctx, device, command, {"repetitions": entry[1]})
+            if status == 200 and transports is not None:
+                wait = transports.wait_ms(job)
+                if wait > 0:
+                    entry[0] = now + wait  # Emitter still busy
+                    continue
+            del self._pending[key]
+            if status == 200:
+                status, job = transmit(self._ctx, job)
+            if status not in (200, 202):
+                print("[coalesce] send failed:", device, command, status, job)
+                continue
+            self._last[key] = now
+            self.sends += 1
+            print("[coalesce]", device, command, "presses=", entry[2], "reps=", entry[1], "capped=", entry[3])
+
+    def stats(self):
+        return {
+            "window_ms": self.window_ms,
+            "pending": len(self._pending),
+            "merged": self.merged,
+            "capped": self.capped,
+            "sends": self.sends,
+        }
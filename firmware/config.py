@@ -1,4 +1,4 @@
-from storage import read_json, write_json_atomic
+from storage import read_json, write_json_atomic, flush_writes
 
 DEFAULT_CONFIG = {
     "pins": {
@@ -8,14 +8,60 @@ DEFAULT_CONFIG = {
     },
     "ir": {
         "tx_freq": 36000,
+        "learn_timeout_ms": 15000,
+        "rx_pio": False,
+        "rx_pio_sm": 4,
+        "listen": False,
+        "listen_protocols": ["NEC_16", "SONY_20", "RC5_IR", "RC6_M0", "MCE"],
+    },
+    "queue": {
+        "interactive": 4,
+        "macro": 2,
+        "timer": 4,
+    },
+    "admission": {
+        "max_delay_ms": 3000,
+        "rate_per_s": 5,
+        "burst": 10,
+    },
+    "coalesce": {
+        "window_ms": 250,
+        "max_repetitions": 16,
+    },
+    "hold": {
+        "deadman_ms": 600,
+        "max_ms": 30000,
     },
     "web": {
         "port": 80,
+        "idempotency_size": 16,
+    },
+    "udp": {
+        "enabled": False,
+        "port": 4210,
+    },
+    "core1": {
+        "enabled": False,
+        "ring_size": 16,
+    },
+    "wifi": {
+        "fast_timeout_ms": 3000,
+        "reuse_ip": False,
+        "reuse_boots": 3,
+    },
+    "time": {
+        "utc_offset_minutes": 0,
     },
     "storage": {
         "codes_filename": "known_codes.json",
         "devices_filename": "devices.json",
         "ui_config_filename": "ui_config.json",
+        "ir_bindings_filename": "ir_bindings.json",
+        "macros_filename": "macros.json",
+        "wifi_cache_filename": "wifi_cache.json",
+        "write_debounce_ms": 1500,
+        "write_max_delay_ms": 10000,
+        "journal_compact_bytes": 8192,
     },
     "debug": False,
 }
@@ -40,4 +86,5 @@ def load_config():
 
 def save_config(cfg):
     # Only persist overrides to keep flash writes minimal
+    flush_writes()  # Don't leave deferred writes behind a config change
     write_json_atomic("config.json", cfg)
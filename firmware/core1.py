@@ -0,0 +1,146 @@
+import time
+
+try:
+    import _thread
+except ImportError:
+    _thread = None
+
+from protocols.dispatch import _transmit, _with_air
+
+_IDLE_SLEEP_MS = 1  # Core 1 poll interval while its ring is empty
+_RESULT_POLL_MS = 5  # Core 0 poll interval while jobs are in flight
+
+
+def _sleep_ms(ms: int):
+    if hasattr(time, "sleep_ms"):
+        time.sleep_ms(ms)
+    else:
+        time.sleep(ms / 1000)
+
+
+class _Ring:
+    """Fixed-size FIFO of slots guarded by a lock (one writer, one reader)."""
+
+    def __init__(self, size: int, lock):
+        self._slots = [None] * size
+        self._head = 0  # Next slot to read
+        self._count = 0
+        self._lock = lock
+
+    def put(self, item) -> bool:
+        with self._lock:
+            if self._count >= len(self._slots):
+                return False
+            self._slots[(self._head + self._count) % len(self._slots)] = item
+            self._count += 1
+            return True
+
+    def take(self):
+        with self._lock:
+            if not self._count:
+                return None
+            item = self._slots[self._head]
+            self._slots[self._head] = None
+            self._head = (self._head + 1) % len(self._slots)
+            self._count -= 1
+            return item
+
+    def __len__(self):
+        return self._count
+
+
+class TxWorker:
+    """Plays compiled TxJobs on the second core (a second thread on a host).
+
+    - Core 0 keeps the network, the server loop and every service (timers,
+      executor, holds, journals); it compiles jobs and hands them over with
+      submit(), so a busy-waited Kenwood frame or a long IR burst no longer
+      stalls request handling
+    - Core 1 only transmits: it takes jobs from a lock-guarded ring and puts
+      (job, result, callback) into a second ring going back
+    - tick() on core 0 delivers the results, so callbacks (executor, batch
+      streams) never run on core 1
+    - At most size jobs are in flight; submit() refuses more
+    """
+
+    def __init__(self, ctx: dict, size: int = 16):
+        if _thread is None:
+            raise RuntimeError("No _thread support")
+        self._ctx = ctx
+        self.size = max(2, int(size))
+        lock = _thread.allocate_lock()
+        self._jobs = _Ring(self.size, lock)
+        self._results = _Ring(self.size, lock)
+        self._inflight = 0  # Core 0 only: submitted, result not delivered
+        self._running = False
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    def start(self):
+        # The IR lock must exist before both cores can reach play_job()
+        if self._ctx.get("ir_lock") is None:
+            self._ctx["ir_lock"] = _thread.allocate_lock()
+        self._running = True
+        _thread.start_new_thread(self._run, ())
+        print("Transmit worker running on core 1, ring", self.size)
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            item = self._jobs.take()
+            if item is None:
+                _sleep_ms(_IDLE_SLEEP_MS)
+                continue
+            job, on_done = item
+            try:
+                result = _transmit(self._ctx, job)
+            except Exception as e:
+                result = 500, {"error": str(e)}
+            self._results.put((job, result, on_done))
+
+    def submit(self, job, on_done=None) -> bool:
+        """Queue job for core 1; on_done(status, payload) follows from tick()."""
+        if self._inflight >= self.size or not self._jobs.put((job, on_done)):
+            self.rejected += 1
+            return False
+        self._inflight += 1
+        self.max_depth = max(self.max_depth, self._inflight)
+        return True
+
+    def depth(self) -> int:
+        return self._inflight
+
+    def next_due_ms(self):
+        return _RESULT_POLL_MS if self._inflight else None
+
+    def tick(self):
+        while True:
+            item = self._results.take()
+            if item is None:
+                return
+            self._inflight -= 1
+            job, result, on_done = item
+            if result[0] == 200:
+                self.sent += 1
+            else:
+                self.failed += 1
+                print("[core1] send failed:", job.device, job.command, result[0], result[1])
+            if on_done is not None:
+                try:
+                    on_done(*_with_air(result, job, 0))
+                except Exception as e:
+                    print("[core1] on_done error:", e)
+
+    def stats(self):
+        return {
+            "running": self._running,
+            "in_flight": self._inflight,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,298 @@
+from protocols.dispatch import compile_command, transmit
+from protocols.job import TxJob, IR_EMITTER
+from scheduler import mono_ms
+
+DEFAULT_DELAY_MS = 1000
+
+# Priority classes, highest first: a waiting higher class gets a busy
+# transport before lower ones once it frees up
+PRIORITIES = ("interactive", "macro", "timer")
+DEFAULT_LIMITS = {"interactive": 4, "macro": 2, "timer": 4}
+# Assumed air time of a step not compiled yet (timer action: a learned
+# frame sent twice)
+ESTIMATE_STEP_MS = 250
+_RETRY_FULL_MS = 20  # Retry delay while the core-1 worker's ring is full
+
+
+def compile_actions(actions, default_delay_ms: int = DEFAULT_DELAY_MS):
+    """Compile timer-style actions into a step plan.
+
+    Each step is (device, command, options, delay_ms): delay_ms is the time
+    from this step's start to the next one (default 1000ms, none after the
+    last one). Invalid entries are skipped but their delay is kept. Macro
+    plans use (TxJob, None, None, delay_ms) steps with precompiled buffers,
+    or a tuple of TxJobs in place of the TxJob to run them in parallel.
+    """
+    steps = []
+    actions = actions or []
+    for i, act in enumerate(actions):
+        act = act or {}
+        reps = None
+        try:
+            reps = int(act.get("repetitions"))
+        except Exception:
+            reps = None
+        delay_ms = default_delay_ms
+        try:
+            if act.get("delay_ms") is not None:
+                delay_ms = max(0, int(act.get("delay_ms")))
+        except Exception:
+            delay_ms = default_delay_ms
+        if i == len(actions) - 1:
+            delay_ms = 0
+        options = {"repetitions": reps} if reps else None
+        steps.append((act.get("device"), act.get("action"), options, delay_ms))
+    return steps
+
+
+def group_steps(compiled):
+    """Turn [(TxJob, delay_ms), ...] into executor steps; jobs with delay_ms 0
+    run together with the following job(s) as one parallel step."""
+    steps = []
+    jobs = []
+    for i, (job, delay_ms) in enumerate(compiled):
+        jobs.append(job)
+        if delay_ms == 0 and i < len(compiled) - 1:
+            continue
+        steps.append((jobs[0] if len(jobs) == 1 else tuple(jobs), None, None, delay_ms))
+        jobs = []
+    return steps
+
+
+class Plan:
+    def __init__(self, pid: int, label: str, steps, on_result=None, on_done=None, priority: str = "timer"):
+        self.id = pid
+        self.label = label
+        self.steps = steps
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.on_result = on_result  # (job, status, payload) after each transmit
+        self.on_done = on_done  # () once the plan finished or was cancelled
+        self.index = 0  # Next step to run
+        self.due = mono_ms()  # Monotonic ms when the next step may run
+        self.started = self.due  # Planned start of the current step
+        self.pending = None  # Jobs of the current step not started yet
+        self.inflight = 0  # Jobs handed to the core-1 worker, result not back yet
+        self.closed = False
+
+    def to_dict(self):
+        return {"id": self.id, "label": self.label, "priority": self.priority, "step": self.index, "steps": len(self.steps)}
+
+
+class Executor:
+    """Cooperative executor for step plans (timer actions, remote bindings).
+
+    - tick() runs at most one due step per plan and then returns, so the
+      server keeps handling requests while a sequence is in progress
+    - Several plans interleave; each waits for its own step delays
+    - Step times are planned from the previous step's planned start, so
+      transmit time and loop latency do not add up along a sequence;
+      lateness goes to sched_stats.step_skew
+    - Jobs only start once their resources are free (ctx["transports"]);
+      a step waiting for the IR emitter does not hold up jobs on other
+      resources, and jobs of a parallel step run side by side
+    - Plans belong to a priority class (interactive > macro > timer, each
+      with its own limit of running plans); due plans are served highest
+      class first and a job waiting for a transport claims it against
+      lower classes, so a "mute" press goes out right after the frame on
+      air instead of after a whole wake-up sequence
+    - Plans may pass on_result/on_done callbacks (streamed batch results);
+      with the core-1 worker results arrive later and on_done waits for them
+    - next_due_ms() lets the server loop sleep until the next step is due
+    """
+
+    def __init__(self, ctx: dict, limits=None):
+        self._ctx = ctx
+        self._stats = ctx.get("sched_stats")
+        self._limits = dict(DEFAULT_LIMITS)
+        self._limits.update(limits or {})
+        self._plans = []  # Kept sorted by (rank, id)
+        self._next_id = 1
+        self.rejected = dict((p, 0) for p in PRIORITIES)
+
+    def submit(self, steps, label: str = None, on_result=None, on_done=None, priority: str = "timer"):
+        """Queue a plan; returns its id, or None when its class is full."""
+        if not steps:
+            return None
+        if priority not in PRIORITIES:
+            priority = "timer"
+        if len([p for p in self._plans if p.priority == priority]) >= int(self._limits.get(priority, 1)):
+            self.rejected[priority] += 1
+            return None
+        plan = Plan(self._next_id, label or "(unnamed)", steps, on_result, on_done, priority)
+        self._next_id += 1
+        self._plans.append(plan)
+        self._plans.sort(key=lambda p: (p.rank, p.id))
+        return plan.id
+
+    def cancel(self, plan_id: int) -> bool:
+        for plan in self._plans:
+            if plan.id == plan_id:
+                self._plans.remove(plan)
+                self._finish(plan)
+                return True
+        return False
+
+    def running(self):
+        return [p.to_dict() for p in self._plans]
+
+    def backlog_ms(self, resource: str = IR_EMITTER):
+        """Air time (ms) of the queued jobs that still need resource."""
+        total_us = 0
+        for plan in self._plans:
+            for i in range(plan.index, len(plan.steps)):
+                dev = plan.steps[i][0]
+                if i == plan.index and plan.pending is not None:
+                    jobs = plan.pending
+                elif isinstance(dev, TxJob):
+                    jobs = (dev,)
+                elif isinstance(dev, (tuple, list)):
+                    jobs = dev
+                else:
+                    if resource == IR_EMITTER:
+                        total_us += ESTIMATE_STEP_MS * 1000
+                    continue
+                for job in jobs:
+                    if resource in job.resources:
+                        total_us += job.air_us
+        return total_us // 1000
+
+    def stats(self):
+        out = {}
+        for prio in PRIORITIES:
+            out[prio] = {
+                "running": len([p for p in self._plans if p.priority == prio]),
+                "limit": self._limits.get(prio),
+                "rejected": self.rejected[prio],
+            }
+        return out
+
+    def next_due_ms(self):
+        if not self._plans:
+            return None
+        now = mono_ms()
+        return max(0, min(p.due for p in self._plans) - now)
+
+    def tick(self):
+        if not self._plans:
+            return
+        done = []
+        claimed = {}  # Resource -> due of the higher-priority plan awaiting it
+        for plan in list(self._plans):
+            if mono_ms() < plan.due:
+                self._claim(plan, claimed)
+                continue
+            self._run_step(plan, claimed)
+            if plan.index >= len(plan.steps):
+                done.append(plan)
+        for plan in done:
+            try:
+                self._plans.remove(plan)
+            except ValueError:
+                pass
+            self._finish(plan)
+
+    def _finish(self, plan: Plan):
+        # With the core-1 worker results may still be on their way
+        plan.closed = True
+        if plan.inflight or plan.on_done is None:
+            return
+        on_done, plan.on_done = plan.on_done, None
+        try:
+            on_done()
+        except Exception as e:
+            print("    on_done error:", e)
+
+    def _sent(self, plan: Plan, job, status, payload):
+        plan.inflight -= 1
+        if status not in (200, 202):
+            print("    send failed:", status, payload)
+        self._report(plan, job, status, payload)
+        if plan.closed and not plan.inflight:
+            self._finish(plan)
+
+    def _report(self, plan: Plan, job, status, payload):
+        if plan.on_result is not None:
+            try:
+                plan.on_result(job, status, payload)
+            except Exception as e:
+                print("    on_result error:", e)
+
+    def _run_step(self, plan: Plan, claimed):
+        dev, cmd, options, delay_ms = plan.steps[plan.index]
+        now = mono_ms()
+        if plan.pending is None:
+            # Step begins
+            if self._stats is not None:
+                self._stats.step_skew.add(now - plan.due)
+            plan.started = plan.due
+            plan.pending = self._jobs(plan, dev, cmd, options)
+        wait = self._start_free(plan, claimed)
+        if plan.pending:
+            # A resource is still busy: retry once it is free
+            plan.due = now + max(1, wait)
+            self._claim(plan, claimed)
+            return
+        plan.pending = None
+        plan.index += 1
+        # Next step relative to this one's planned start (never in the past)
+        plan.due = max(plan.started + delay_ms, now)
+
+    def _jobs(self, plan: Plan, dev, cmd, options):
+        if isinstance(dev, TxJob):
+            jobs = [dev]
+        elif isinstance(dev, (tuple, list)):
+            jobs = list(dev)
+        elif dev and cmd:
+            print("  ->", plan.label, dev, cmd, "reps=", (options or {}).get("repetitions") or "default")
+            status, job = compile_command(self._ctx, dev, cmd, options)
+            if status != 200:
+                print("    send failed:", status, job)
+                return []
+            jobs = [job]
+        else:
+            return []
+        transports = self._ctx.get("transports")
+        return transports.order(jobs) if transports is not None else jobs
+
+    @staticmethod
+    def _claim(plan: Plan, claimed):
+        for job in plan.pending or ():
+            for r in job.resources:
+                if r not in claimed:
+                    claimed[r] = plan.due
+
+    def _start_free(self, plan: Plan, claimed):
+        """Transmit pending jobs whose resources are free (and not claimed by
+        a higher-priority plan); returns ms until the next retry (0 when all
+        were started)."""
+        transports = self._ctx.get("transports")
+        wait = 0
+        for job in list(plan.pending):
+            w = transports.wait_ms(job) if transports is not None else 0
+            if w <= 0 and claimed:
+                for r in job.resources:
+                    if r in claimed:
+                        # Retry once the higher-priority job got its turn
+                        w = max(w, claimed[r] - mono_ms() + 1, 1)
+            if w > 0:
+                wait = w if not wait else min(wait, w)
+                continue
+            plan.pending.remove(job)
+            if self._stats is not None:
+                self._stats.queue(plan.priority).add(mono_ms() - plan.started)
+            inflight = plan.inflight
+            plan.inflight += 1
+            try:
+                status, payload = transmit(self._ctx, job, lambda st, pl, job=job: self._sent(plan, job, st, pl))
+            except Exception as e:
+                print("    send exception:", e)
+                self._sent(plan, job, 500, {"error": str(e)})
+                continue
+            if status == 503 and plan.inflight > inflight:
+                # Worker ring full (no callback will come): try the job again
+                plan.inflight = inflight
+                plan.pending.insert(0, job)
+                wait = _RETRY_FULL_MS
+                break
+        return wait
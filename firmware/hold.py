@@ -0,0 +1,151 @@
+from protocols.dispatch import compile_command, transmit
+from protocols.ir import play_job, is_nec, NEC_REPEAT, NEC_PERIOD_MS, IR_REPEAT_GAP_US
+from protocols.job import TxJob, build_buffer
+from scheduler import mono_ms
+
+
+class Hold:
+    def __init__(self, hid: int, job, repeat_job, period_ms: int, mode: str, now: int):
+        self.id = hid
+        self.job = job  # First (full) frame
+        self.repeat_job = repeat_job  # Sent every period_ms while held
+        self.period_ms = period_ms
+        self.mode = mode  # "nec_repeat" or "frame"
+        self.started = now
+        self.next_ms = now + period_ms  # Planned start of the next repeat
+        self.alive_ms = now  # Last start/keep-alive from the client
+        self.frames = 1
+
+    def to_dict(self):
+        return {
+            "hold_id": self.id,
+            "device": self.job.device,
+            "command": self.job.command,
+            "mode": self.mode,
+            "period_ms": self.period_ms,
+            "frames": self.frames,
+            "held_ms": mono_ms() - self.started,
+        }
+
+
+class HoldManager:
+    """Press-and-hold: keeps repeating a command until released.
+
+    - start() sends the full frame once, then tick() repeats at the
+      protocol's own rate: NEC-shaped learned codes send the short NEC repeat
+      code every 108ms, other carrier codes loop their frame with the usual
+      gap (SAA3004/RC5 frames already span their period)
+    - Repeats are planned start-to-start and only go out while the IR
+      emitter is free, so queued sends can slip in between two of them
+    - Calling start() again for the same device/command is the keep-alive;
+      without one for deadman_ms (client gone) the hold stops by itself,
+      and no hold lasts longer than max_ms
+    - One hold per device; starting another command replaces it
+    """
+
+    def __init__(self, ctx: dict, deadman_ms: int = 600, max_ms: int = 30000):
+        self._ctx = ctx
+        self.deadman_ms = max(100, int(deadman_ms))
+        self.max_ms = int(max_ms)
+        self._holds = {}  # device -> Hold
+        self._next_id = 1
+        self.timeouts = 0  # Holds stopped by the dead-man timeout
+
+    def start(self, device: str, command: str):
+        now = mono_ms()
+        h = self._holds.get(device)
+        if h is not None and h.job.command == command:
+            h.alive_ms = now
+            return 200, dict(h.to_dict(), status="holding")
+
+        status, job = compile_command(self._ctx, device, command, {"repetitions": 1})
+        if status != 200:
+            return status, job
+        if job.freq is None:
+            return 400, {"error": f"Protocol '{job.protocol}' has no repeat frames"}
+        # Classified before sending: the RP2 RMT writes into the buffer it sends
+        nec = [job.protocol == "IR" and buf is not None and is_nec(buf) for buf in job.frames]
+        # On this core: the toggle state below must be the one just sent
+        status, payload = transmit(self._ctx, job, direct=True)
+        if status != 200:
+            return status, payload
+        # The variant that was just sent (transmit advanced the toggle)
+        variant = 1 - int(payload.get("toggle_next") or 0)
+        buf = job.frames[variant]
+        if nec[variant]:
+            rbuf = build_buffer(NEC_REPEAT)
+            period_ms = NEC_PERIOD_MS
+            mode = "nec_repeat"
+        else:
+            rbuf = buf
+            gap_us = IR_REPEAT_GAP_US if job.protocol == "IR" else 0
+            period_ms = (job.air_us + gap_us + 999) // 1000
+            mode = "frame"
+        repeat_job = TxJob(job.protocol, device, command, (rbuf,), freq=job.freq, info=job.info)
+        repeat_job.asize = max(repeat_job.asize, job.asize)  # Keep the current Player
+
+        self._stop(device, "replaced")
+        h = Hold(self._next_id, job, repeat_job, period_ms, mode, now)
+        self._next_id += 1
+        self._holds[device] = h
+        return 200, dict(h.to_dict(), status="started", deadman_ms=self.deadman_ms)
+
+    def holding(self, device: str, command: str) -> bool:
+        h = self._holds.get(device)
+        return h is not None and h.job.command == command
+
+    def stop(self, device: str = None, hold_id: int = None):
+        for name, h in list(self._holds.items()):
+            if name == device or h.id == hold_id:
+                return 200, dict(self._stop(name, "stopped"), status="stopped")
+        return 404, {"error": "No active hold"}
+
+    def _stop(self, device: str, reason: str):
+        h = self._holds.pop(device, None)
+        if h is None:
+            return None
+        print("[hold]", reason, device, h.job.command, "frames=", h.frames)
+        return h.to_dict()
+
+    def active(self):
+        return [h.to_dict() for h in self._holds.values()]
+
+    def next_due_ms(self):
+        if not self._holds:
+            return None
+        now = mono_ms()
+        due = min(min(h.next_ms, h.alive_ms + self.deadman_ms) for h in self._holds.values())
+        return max(0, due - now)
+
+    def tick(self):
+        if not self._holds:
+            return
+        now = mono_ms()
+        transports = self._ctx.get("transports")
+        for device, h in list(self._holds.items()):
+            if now - h.alive_ms >= self.deadman_ms or now - h.started >= self.max_ms:
+                self.timeouts += 1
+                self._stop(device, "timeout")
+                continue
+            if now < h.next_ms:
+                continue
+            if transports is not None:
+                wait = transports.wait_ms(h.repeat_job)
+                if wait > 0:
+                    h.next_ms = now + wait
+                    continue
+            job = h.repeat_job
+            try:
+                play_job(self._ctx, job, job.frames[0])
+            except Exception as e:
+                print("[hold] send failed:", e)
+                self._stop(device, "error")
+                continue
+            if transports is not None:
+                transports.note(job, now)
+            h.frames += 1
+            # Keep the start-to-start grid unless we fell a whole period behind
+            h.next_ms = max(h.next_ms + h.period_ms, now + 1)
+
+    def stats(self):
+        return {"active": self.active(), "timeouts": self.timeouts}
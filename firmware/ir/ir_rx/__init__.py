@@ -22,6 +22,7 @@ from utime import ticks_us
 
 class IR_RX:
     Timer_id = -1  # Software timer but enable override
+    _pio_sm = None  # RP2: state machine for PIO edge capture. See use_pio()
     # Result/error codes
     # Repeat button code
     REPEAT = -1
@@ -33,6 +34,14 @@ class IR_RX:
     BADDATA = -6
     BADADDR = -7
 
+    # RP2 only: measure pulse widths with a PIO state machine (1μs, independent
+    # of IRQ latency) instead of timestamping every edge in a pin IRQ. Only the
+    # first edge of each frame raises an IRQ. Call before instantiating;
+    # sm_no=None goes back to pin IRQs.
+    @classmethod
+    def use_pio(cls, sm_no=4):
+        cls._pio_sm = sm_no
+
     def __init__(self, pin, nedges, tblock, callback, *args):  # Optional args for callback
         self._pin = pin
         self._nedges = nedges
@@ -43,10 +52,19 @@ class IR_RX:
         self.verbose = True
 
         self._times = array("i", (0 for _ in range(nedges + 1)))  # +1 for overrun
-        pin.irq(handler=self._cb_pin, trigger=(Pin.IRQ_FALLING | Pin.IRQ_RISING))
         self.edge = 0
         self.tim = Timer(self.Timer_id)  # Defaul is sofware timer
         self.cb = self.decode
+        self._src = None
+        if pin is None:  # Detached decoder: the owner fills ._times via feed()
+            pass
+        elif self._pio_sm is None:
+            pin.irq(handler=self._cb_pin, trigger=(Pin.IRQ_FALLING | Pin.IRQ_RISING))
+        else:
+            from ir_rx.rp2_pio import RP2_PIO_RX
+            self._src = RP2_PIO_RX(pin, nedges, self._pio_sm)
+            self.cb = self._cb_block
+            self._arm_first()
 
     # Pin interrupt. Save time of each edge for later decode.
     def _cb_pin(self, line):
@@ -58,8 +76,31 @@ class IR_RX:
             self._times[self.edge] = t
             self.edge += 1
 
+    # PIO capture: one IRQ on the first (falling) edge starts the block timer.
+    def _arm_first(self):
+        self._pin.irq(handler=self._cb_first, trigger=Pin.IRQ_FALLING)
+
+    def _cb_first(self, line):
+        self._pin.irq(handler=None)
+        self._src.first_edge()
+        self.tim.init(period=self._tblock, mode=Timer.ONE_SHOT, callback=self.cb)
+
+    # Block timer expired: fill ._times from the captured widths, then decode.
+    def _cb_block(self, t):
+        self.edge = self._src.collect(self._times)
+        self.decode(t)
+
+    # Detached decoder: decode a burst captured by another receiver. times holds
+    # edge timestamps as recorded by IR_RX, edge is the number of edges.
+    def feed(self, times, edge):
+        self._times = times
+        self.edge = edge
+        self.decode(None)
+
     def do_callback(self, cmd, addr, ext, thresh=0):
         self.edge = 0
+        if self._src is not None:
+            self._arm_first()
         if cmd >= thresh:
             self.callback(cmd, addr, ext, *self.args)
         else:
@@ -69,5 +110,8 @@ class IR_RX:
         self._errf = func
 
     def close(self):
-        self._pin.irq(handler=None)
+        if self._pin is not None:
+            self._pin.irq(handler=None)
         self.tim.deinit()
+        if self._src is not None:
+            self._src.close()
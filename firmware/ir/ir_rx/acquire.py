@@ -7,92 +7,146 @@
 
 from machine import Pin, freq
 from sys import platform
+from array import array
 
 from utime import sleep_ms, ticks_us, ticks_diff
 from ir_rx import IR_RX
 
 
+def near(v, target):
+    return target * 0.8 < v < target * 1.2
+
+
+# Captured bursts are written into a preallocated ring of nslots slots of
+# nedges durations each (array 'H', μs, clamped to 65535). decode() runs in
+# soft IRQ context and never allocates; the consumer reads the oldest slot via
+# peek() (memoryview) or copy() (compact array) and releases it with pop().
+# When the ring is full further bursts are dropped and counted in .overruns.
 class IR_GET(IR_RX):
-    def __init__(self, pin, nedges=100, twait=100, display=True):
+    def __init__(self, pin, nedges=100, twait=100, display=False, nslots=2):
         self.display = display
         super().__init__(pin, nedges, twait, lambda *_ : None)
-        self.data = None
+        self._slot = nedges
+        self._nslots = nslots
+        self._ring = array('H', (0 for _ in range(nedges * nslots)))
+        self._mvr = memoryview(self._ring)
+        self._lens = array('H', (0 for _ in range(nslots)))
+        self._head = 0  # Total slots written
+        self._tail = 0  # Total slots consumed
+        self.overruns = 0
 
     def decode(self, _):
-        def near(v, target):
-            return target * 0.8 < v < target * 1.2
         lb = self.edge - 1  # Possible length of burst
-        if lb < 3:
-            return  # Noise
-        burst = []
+        if lb < 3 or self._head - self._tail >= self._nslots:
+            if lb >= 3:
+                self.overruns += 1
+            self.do_callback(0, 0, 0)  # Noise or ring full: discard
+            return
+        base = (self._head % self._nslots) * self._slot
+        ring = self._ring
+        n = 0
         for x in range(lb):
             dt = ticks_diff(self._times[x + 1], self._times[x])
             if x > 0 and dt > 10000:  # Reached gap between repeats
                 break
-            burst.append(dt)
-        lb = len(burst)  # Actual length
+            ring[base + n] = dt if dt < 0xFFFF else 0xFFFF
+            n += 1
+        self._lens[self._head % self._nslots] = n
+        self._head += 1
+        if self.display:
+            self._show(base, n)
+        # Set up for new data burst. Run null callback
+        self.do_callback(0, 0, 0)
+
+    # Debug output: list edges and attempt to determine protocol
+    def _show(self, base, lb):
+        burst = self._mvr[base : base + lb]
         # Duration of pulse train 24892 for RC-5 22205 for RC-6
-        duration = ticks_diff(self._times[lb - 1], self._times[0])
+        duration = sum(burst)
+        for x, e in enumerate(burst):
+            print('{:03d} {:5d}'.format(x, e))
+        print()
+        ok = False  # Protocol not yet found
+        if near(burst[0], 9000) and lb == 67:
+            print('NEC')
+            ok = True
+
+        if not ok and near(burst[0], 2400) and near(burst[1], 600):  # Maybe Sony
+            try:
+                nbits = {25:12, 31:15, 41:20}[lb]
+            except KeyError:
+                pass
+            else:
+                ok = True
+                print('Sony {}bit'.format(nbits))
 
-        if self.display:
-            for x, e in enumerate(burst):
-                print('{:03d} {:5d}'.format(x, e))
-            print()
-            # Attempt to determine protocol
-            ok = False  # Protocol not yet found
-            if near(burst[0], 9000) and lb == 67:
-                print('NEC')
+        if not ok and near(burst[0], 889):  # Maybe RC-5
+            if near(duration, 24892) and near(max(burst), 1778):
+                print('Philps RC-5')
                 ok = True
 
-            if not ok and near(burst[0], 2400) and near(burst[1], 600):  # Maybe Sony
-                try:
-                    nbits = {25:12, 31:15, 41:20}[lb]
-                except KeyError:
-                    pass
-                else:
-                    ok = True
-                    print('Sony {}bit'.format(nbits))
-
-            if not ok and near(burst[0], 889):  # Maybe RC-5
-                if near(duration, 24892) and near(max(burst), 1778):
-                    print('Philps RC-5')
-                    ok = True
-
-            if not ok and near(burst[0], 2666) and near(burst[1], 889):  # RC-6?
-                if near(duration, 22205) and near(burst[1], 889) and near(burst[2], 444):
-                    print('Philips RC-6 mode 0')
-                    ok = True
-
-            if not ok and near(burst[0], 2000) and near(burst[1], 1000):
-                if near(duration, 19000):
-                    print('Microsoft MCE edition protocol.')
-                    # Constant duration, variable burst length, presumably bi-phase
-                    print('Protocol start {} {} Burst length {} duration {}'.format(burst[0], burst[1], lb, duration))
-                    ok = True
-
-            if not ok and near(burst[0], 4500) and near(burst[1], 4500) and lb == 67:  # Samsung
-                print('Samsung')
+        if not ok and near(burst[0], 2666) and near(burst[1], 889):  # RC-6?
+            if near(duration, 22205) and near(burst[1], 889) and near(burst[2], 444):
+                print('Philips RC-6 mode 0')
                 ok = True
 
-            if not ok and near(burst[0], 3500) and near(burst[1], 1680):  # Panasonic?
-                print('Unsupported protocol. Panasonic?')
+        if not ok and near(burst[0], 2000) and near(burst[1], 1000):
+            if near(duration, 19000):
+                print('Microsoft MCE edition protocol.')
+                # Constant duration, variable burst length, presumably bi-phase
+                print('Protocol start {} {} Burst length {} duration {}'.format(burst[0], burst[1], lb, duration))
                 ok = True
 
-            if not ok:
-                print('Unknown protocol start {} {} Burst length {} duration {}'.format(burst[0], burst[1], lb, duration))
+        if not ok and near(burst[0], 4500) and near(burst[1], 4500) and lb == 67:  # Samsung
+            print('Samsung')
+            ok = True
 
-            print()
-        self.data = burst
-        # Set up for new data burst. Run null callback
-        self.do_callback(0, 0, 0)
+        if not ok and near(burst[0], 3500) and near(burst[1], 1680):  # Panasonic?
+            print('Unsupported protocol. Panasonic?')
+            ok = True
+
+        if not ok:
+            print('Unknown protocol start {} {} Burst length {} duration {}'.format(burst[0], burst[1], lb, duration))
+
+        print()
+
+    # Consumer interface (main loop context)
+    def available(self):
+        return self._head - self._tail
+
+    def peek(self):  # memoryview of oldest captured burst, valid until pop()
+        if self._head == self._tail:
+            return None
+        i = self._tail % self._nslots
+        base = i * self._slot
+        return self._mvr[base : base + self._lens[i]]
+
+    def pop(self):
+        if self._head != self._tail:
+            self._tail += 1
+
+    def copy(self):  # Compact copy of oldest burst, releasing its slot
+        mv = self.peek()
+        if mv is None:
+            return None
+        data = array('H', mv)
+        self.pop()
+        return data
+
+    def rearm(self):  # Discard anything captured so far
+        self._tail = self._head
+
+    @property
+    def data(self):
+        return self.peek()
 
     def acquire(self):
-        while self.data is None:
+        while self._head == self._tail:
             sleep_ms(5)
         self.close()
-        return self.data
+        return self.copy()
 
-def test():
+def test(display=False):
     # Define pin according to platform
     if platform == 'pyboard':
         pin = Pin('X3', Pin.IN)
@@ -103,6 +157,7 @@ def test():
         pin = Pin(23, Pin.IN)
     elif platform == 'rp2':
         pin = Pin(16, Pin.IN)
-    irg = IR_GET(pin)
-    print('Waiting for IR data...')
+    irg = IR_GET(pin, display=display)
+    if display:
+        print('Waiting for IR data...')
     return irg.acquire()
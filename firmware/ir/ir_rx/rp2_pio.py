@@ -0,0 +1,157 @@
+# rp2_pio.py PIO pulse-width capture for the IR receivers on RP2.
+
+# Released under the MIT License (MIT). See LICENSE.
+
+# The pulsewidth program measures each mark and space of the demodulated
+# signal in 1μs ticks and pushes the widths to the RX FIFO. A DMA channel
+# drains the FIFO into a buffer so no CPU time is spent per edge; where
+# rp2.DMA is unavailable a fast soft timer drains the FIFO in batches.
+# IR_RX only takes one pin IRQ per frame (the first edge, to start its block
+# timer) and rebuilds its ._times array from the widths with collect().
+
+# Marks are pushed when they end. A space is pushed when the following mark
+# starts, so the idle gap before a frame arrives as the first word of that
+# frame and the last space of a frame is never part of it. Words alternate
+# mark, space, ... from the first push, so the parity of the running word
+# count tells which is which. A burst longer than the buffer loses words
+# (DMA stops, the FIFO fills and push(noblock) drops), and with them the
+# parity: collect() then restarts the state machine, which begins again
+# with a mark.
+
+from machine import Timer
+from array import array
+import rp2
+
+try:
+    from rp2 import DMA
+except ImportError:
+    DMA = None
+
+_PIO_BASE = (0x50200000, 0x50300000)
+_RXF0 = 0x20  # RXF0 register offset
+_DREQ_RX0 = (4, 12)  # DREQ_PIO0_RX0, DREQ_PIO1_RX0
+_FIFO_DEPTH = 8  # Joined RX FIFO
+
+
+# 2 instructions per count at 2MHz: 1μs resolution. TSOP output is active low.
+@rp2.asm_pio(fifo_join=rp2.PIO.JOIN_RX)
+def pulsewidth():
+    wait(0, pin, 0)  # Start at the first mark
+    wrap_target()
+    mov(x, invert(null))
+    label("mark")
+    jmp(pin, "mark_end")  # Pin high: mark ended
+    jmp(x_dec, "mark")
+    label("mark_end")
+    mov(isr, invert(x))  # Ticks elapsed
+    push(noblock)
+    mov(x, invert(null))
+    label("space")
+    jmp(x_dec, "space_chk")
+    label("space_chk")
+    jmp(pin, "space")  # Pin still high: space continues
+    mov(isr, invert(x))
+    push(noblock)
+    wrap()
+
+
+class RP2_PIO_RX:
+    def __init__(self, pin, nedges, sm_no=4, sm_freq=2_000_000):
+        self._pin = pin
+        self._n = nedges + 2  # Leading idle space and overrun word
+        self._buf = array("I", (0 for _ in range(self._n)))
+        self._odd = 0  # Parity of words consumed since the state machine started
+        self._start = 0  # Index of the word pushed at the first edge of a frame
+        self._got = 0  # Words in ._buf (batch drain)
+        self._lost = False  # Batch drain discarded words
+        self.overruns = 0  # Resyncs after lost words
+        self._freq = sm_freq
+        self.sm = rp2.StateMachine(sm_no, pulsewidth, freq=sm_freq, in_base=pin, jmp_pin=pin)
+        pio, idx = divmod(sm_no, 4)
+        if DMA is not None:
+            self._dma = DMA()
+            self._rxf = _PIO_BASE[pio] + _RXF0 + 4 * idx
+            self._ctrl = self._dma.pack_ctrl(size=2, inc_read=False, treq_sel=_DREQ_RX0[pio] + idx)
+            self._drain = None
+        else:
+            self._dma = None
+            self._drain = Timer(-1)
+        self._restart()
+        self.sm.active(1)
+
+    def _restart(self):  # Point the drain at the start of ._buf
+        self._got = 0
+        if self._dma is not None:
+            self._dma.config(read=self._rxf, write=self._buf, count=self._n, ctrl=self._ctrl, trigger=True)
+
+    def _count(self):  # Words captured into ._buf so far
+        if self._dma is not None:
+            return self._n - self._dma.count
+        return self._got
+
+    def _batch(self, _):  # Soft timer: move FIFO contents into ._buf
+        sm = self.sm
+        while sm.rx_fifo():
+            w = sm.get()
+            if self._got < self._n:
+                self._buf[self._got] = w
+                self._got += 1
+            else:
+                self._lost = True
+
+    def first_edge(self):
+        # Called from the first-edge pin IRQ. Words before this point belong
+        # to an earlier frame; the idle space is pushed at this very edge.
+        self._start = self._count()
+        if self._drain is not None:
+            self._drain.init(period=2, mode=Timer.PERIODIC, callback=self._batch)
+
+    def collect(self, times):
+        # Rebuild edge timestamps (relative, μs) into times. Returns edge count.
+        if self._drain is not None:
+            self._drain.deinit()
+            self._batch(None)
+        else:
+            self._dma.active(0)
+        got = self._count()
+        # Buffer full (DMA count ran out) or FIFO full: words were dropped
+        lost = self._lost or got >= self._n or self.sm.rx_fifo() >= _FIFO_DEPTH
+        x = self._start
+        if (self._odd + x) & 1:  # Skip a space (stale idle gap)
+            x += 1
+        nt = len(times)
+        edge = 0
+        if x < got:
+            t = 0
+            times[0] = t
+            edge = 1
+            while x < got and edge < nt:
+                t += self._buf[x]
+                times[edge] = t
+                edge += 1
+                x += 1
+        self._odd = (self._odd + got) & 1
+        self._start = 0
+        if lost:
+            self._resync()
+        self._restart()
+        return edge
+
+    def _resync(self):
+        # Parity is unknown after lost words: start over at the next mark
+        self.overruns += 1
+        self.sm.active(0)
+        self.sm.init(pulsewidth, freq=self._freq, in_base=self._pin, jmp_pin=self._pin)
+        while self.sm.rx_fifo():
+            self.sm.get()
+        self._odd = 0
+        self._lost = False
+        self.sm.active(1)
+
+    def close(self):
+        self.sm.active(0)
+        if self._dma is not None:
+            self._dma.active(0)
+            self._dma.close()
+        else:
+            self._drain.deinit()
@@ -144,3 +144,14 @@ class Player(IR):
             self._arr[x] = t
         self.aptr = x + 1
         self.trigger()
+
+    # Prebuilt array('H'): times followed by two 0 slots (STOP and room for a
+    # closing space). Waits for a previous frame to finish. On RP2 the PIO
+    # reads it directly, so it must not change while busy.
+    def play_buffer(self, arr):
+        while self.busy():
+            pass
+        if RP2:
+            self._rmt.send(arr)
+        else:
+            self.play(memoryview(arr)[:len(arr) - 2])
@@ -0,0 +1,189 @@
+try:
+    import ujson as json
+except ImportError:
+    import json  # type: ignore
+
+from storage import read_json, write_json_atomic, append_line, file_size, remove_file, replace_file, note_write
+from jsonstream import JsonStream, LazyArray, load_lazy, dump_lazy, materialize
+
+# Journal records, one JSON array per line:
+#   ["put", key, value]           replace a record
+#   ["del", key]                  remove a record
+#   ["set", key, [k1, k2, ...], value]   set a nested field of a record
+# All records carry absolute values, so replaying a journal on top of a
+# snapshot that already contains some of its changes gives the same state.
+
+
+class JournalStore:
+    """Key/value store kept as a JSON snapshot plus an append-only journal.
+
+    - Mutations append one small record to <path>.log (cost depends on the
+      change, not on the store size) and update the in-memory dict
+    - At boot the snapshot (<path>, the plain JSON document used before) is
+      loaded and the journal replayed; a torn last line (power cut during an
+      append) is ignored and the journal compacted right away; if that
+      fails, the in-memory state stays and tick() retries after each append
+    - Once the journal passes compact_bytes, tick() writes a new snapshot
+      atomically and drops the journal
+    - key_field: accept a snapshot that is a list of records keyed by this
+      field (older timers.json layout)
+    - lazy_min: number arrays with at least this many items (learned IR
+      timings) stay in the snapshot as jsonstream.LazyArray references and
+      are only read when used, so RAM does not grow with the store
+    """
+
+    def __init__(self, path: str, compact_bytes: int = 8192, key_field: str = None, lazy_min: int = None):
+        self._path = path
+        self._lazy_min = lazy_min
+        self._log = path + ".log"
+        self.compact_bytes = int(compact_bytes)
+        self._limit = self.compact_bytes  # Journal size that triggers compaction
+        self.compactions = 0
+        self._torn = False  # Journal holds a torn line; records after it would not replay
+        self.version = 0  # Bumped on every mutation (cache invalidation)
+        self._data = {}
+        self._load(key_field)
+
+    def _load(self, key_field):
+        if self._lazy_min:
+            snap = load_lazy(self._path, self._lazy_min, {})
+        else:
+            snap = read_json(self._path, {})
+        if isinstance(snap, list) and key_field:
+            snap = dict((r[key_field], r) for r in snap if isinstance(r, dict) and r.get(key_field))
+        self._data = snap if isinstance(snap, dict) else {}
+        torn = False
+        try:
+            with open(self._log, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, TypeError, IndexError, KeyError):
+                        # Only the last append can be torn; stop there
+                        torn = True
+                        break
+        except OSError:
+            pass
+        self._log_bytes = file_size(self._log)
+        if torn:
+            print("[journal] torn record in", self._log)
+            self._torn = True
+            self._limit = 0
+            self.tick()
+
+    def _apply(self, rec):
+        op = rec[0]
+        if op == "put":
+            self._data[rec[1]] = rec[2]
+        elif op == "del":
+            self._data.pop(rec[1], None)
+        elif op == "set":
+            node = self._data.setdefault(rec[1], {})
+            path = rec[2]
+            for k in path[:-1]:
+                if not isinstance(node.get(k), dict):
+                    node[k] = {}
+                node = node[k]
+            node[path[-1]] = rec[3]
+        else:
+            raise ValueError("Unknown journal op '%s'" % op)
+
+    def _append(self, rec):
+        if self._lazy_min:
+            rec = materialize(rec)
+        text = json.dumps(rec)
+        append_line(self._log, text)
+        self._log_bytes += len(text) + 1
+
+    # ---- reads ----
+    def data(self):
+        """Live dict of all records; mutate only through put/delete/set."""
+        return self._data
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    # ---- mutations ----
+    # The in-memory state changes first; an OSError from the append means the
+    # change is live but not durable (same as a failed whole-file write).
+    def put(self, key, value):
+        self.version += 1
+        self._data[key] = value
+        self._append(["put", key, value])
+
+    def delete(self, key):
+        """Remove and return a record (None when missing)."""
+        if key not in self._data:
+            return None
+        self.version += 1
+        value = self._data.pop(key)
+        self._append(["del", key])
+        return value
+
+    def set(self, key, path, value):
+        """Set a nested field, e.g. set("Amp", ["ir", "commands", "on"], entry)."""
+        rec = ["set", key, list(path), value]
+        self.version += 1
+        self._apply(rec)
+        self._append(rec)
+
+    # ---- compaction ----
+    def compact(self):
+        if self._lazy_min:
+            self._compact_lazy()
+        else:
+            write_json_atomic(self._path, self._data)
+        # A crash before this leaves a journal that replays to the same state
+        remove_file(self._log)
+        self._log_bytes = 0
+        self._limit = self.compact_bytes
+        self._torn = False
+        self.compactions += 1
+
+    def _compact_lazy(self):
+        # Streams the snapshot out record by record; lazy arrays are copied
+        # from the old snapshot one at a time.
+        tmp = self._path + ".tmp"
+        try:
+            src_file = open(self._path, "rb")
+        except OSError:
+            src_file = None
+        try:
+            with open(tmp, "wb") as f:
+                src = JsonStream(src_file) if src_file is not None else None
+                fixups = dump_lazy(self._data, f, self._lazy_min, src)
+                size = f.tell()
+        finally:
+            if src_file is not None:
+                src_file.close()
+        replace_file(tmp, self._path)
+        note_write(size)
+        for parent, key, offset, length in fixups:
+            parent[key] = LazyArray(self._path, offset, length)
+
+    def next_due_ms(self):
+        return 0 if self._log_bytes >= self._limit else None
+
+    def tick(self):
+        if self._log_bytes >= self._limit:
+            try:
+                self.compact()
+            except Exception as e:
+                # Retry once the journal has grown by another threshold, or
+                # after the next append while a torn line is still in it
+                self._limit = self._log_bytes + (1 if self._torn else self.compact_bytes)
+                print("[journal] compaction failed:", self._path, e)
+
+    def stats(self):
+        return {
+            "records": len(self._data),
+            "journal_bytes": self._log_bytes,
+            "compact_bytes": self.compact_bytes,
+            "compactions": self.compactions,
+        }
@@ -0,0 +1,293 @@
+try:
+    import ujson as json
+except ImportError:
+    import json  # type: ignore
+
+from array import array
+
+_WS = b" \t\r\n"
+_END = b",]}: \t\r\n"  # Bytes that end a number/true/false/null
+_NUM = b"-0123456789"
+_QUOTE, _BSLASH, _COLON, _COMMA = 0x22, 0x5C, 0x3A, 0x2C
+_LBRACE, _RBRACE, _LBRACKET, _RBRACKET = 0x7B, 0x7D, 0x5B, 0x5D
+
+
+class JsonStream:
+    """Pull parser over a binary file.
+
+    Builds documents value by value and skips number arrays in place, so
+    large arrays are never held in memory until they are read.
+    """
+
+    def __init__(self, f, bufsize: int = 256):
+        self._f = f
+        self._buf = bytearray(bufsize)
+        self._n = 0
+        self._i = 0
+        self._base = 0  # File offset of _buf[0]
+
+    def tell(self):
+        return self._base + self._i
+
+    def seek(self, pos: int):
+        self._f.seek(pos)
+        self._base = pos
+        self._n = self._i = 0
+
+    def peek(self):
+        """Next byte without consuming it, -1 at end of file."""
+        if self._i >= self._n:
+            self._base += self._n
+            self._n = self._f.readinto(self._buf) or 0
+            self._i = 0
+            if not self._n:
+                return -1
+        return self._buf[self._i]
+
+    def _ws(self):
+        while True:
+            c = self.peek()
+            if c < 0 or c not in _WS:
+                return c
+            self._i += 1
+
+    def _expect(self, byte):
+        if self._ws() != byte:
+            raise ValueError("Expected '%s' at %d" % (chr(byte), self.tell()))
+        self._i += 1
+
+    def _string(self, out):
+        self._i += 1  # Opening quote
+        if out is not None:
+            out.append(_QUOTE)
+        escaped = False
+        while True:
+            c = self.peek()
+            if c < 0:
+                raise ValueError("Truncated JSON string")
+            self._i += 1
+            if out is not None:
+                out.append(c)
+            if escaped:
+                escaped = False
+            elif c == _BSLASH:
+                escaped = True
+            elif c == _QUOTE:
+                return
+
+    def _scalar(self, out):
+        while True:
+            c = self.peek()
+            if c < 0 or c in _END:
+                return
+            self._i += 1
+            if out is not None:
+                out.append(c)
+
+    def skip(self, out=None):
+        """Skip one value; with out (bytearray) its raw bytes are collected."""
+        c = self._ws()
+        if c == _QUOTE:
+            self._string(out)
+            return
+        if c != _LBRACE and c != _LBRACKET:
+            if c < 0:
+                raise ValueError("Truncated JSON")
+            self._scalar(out)
+            return
+        depth = 0
+        while True:
+            c = self.peek()
+            if c == _QUOTE:
+                self._string(out)
+                continue
+            if c < 0:
+                raise ValueError("Truncated JSON")
+            self._i += 1
+            if out is not None:
+                out.append(c)
+            if c == _LBRACE or c == _LBRACKET:
+                depth += 1
+            elif c == _RBRACE or c == _RBRACKET:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def load(self):
+        """Materialize the next value (only that subtree)."""
+        out = bytearray()
+        self.skip(out)
+        return json.loads(out)
+
+    def members(self):
+        """Iterate an object: yields each key with the stream at its value.
+
+        The value must be consumed (skip/load/build...) before the next key.
+        """
+        self._expect(_LBRACE)
+        if self._ws() == _RBRACE:
+            self._i += 1
+            return
+        while True:
+            if self._ws() != _QUOTE:
+                raise ValueError("Expected key at %d" % self.tell())
+            out = bytearray()
+            self._string(out)
+            self._expect(_COLON)
+            self._ws()
+            yield json.loads(out)
+            c = self._ws()
+            self._i += 1
+            if c == _RBRACE:
+                return
+            if c != _COMMA:
+                raise ValueError("Expected ',' or '}' at %d" % self.tell())
+
+    def elements(self):
+        """Iterate an array: yields each index with the stream at its value."""
+        self._expect(_LBRACKET)
+        if self._ws() == _RBRACKET:
+            self._i += 1
+            return
+        i = 0
+        while True:
+            self._ws()
+            yield i
+            i += 1
+            c = self._ws()
+            self._i += 1
+            if c == _RBRACKET:
+                return
+            if c != _COMMA:
+                raise ValueError("Expected ',' or ']' at %d" % self.tell())
+
+    def read_numbers(self, out):
+        """Append the numbers of the next array to out (e.g. an array('i'))."""
+        for _ in self.elements():
+            buf = bytearray()
+            self._scalar(buf)
+            out.append(json.loads(buf))
+        return out
+
+    def build(self, lazy_min: int, path: str):
+        """Materialize the next value, leaving number arrays of at least
+        lazy_min items in the file as LazyArray references."""
+        c = self._ws()
+        if c == _LBRACE:
+            d = {}
+            for key in self.members():
+                d[key] = self.build(lazy_min, path)
+            return d
+        if c == _LBRACKET:
+            start = self.tell()
+            n = 0
+            numeric = True
+            for _ in self.elements():
+                if numeric and self.peek() not in _NUM:
+                    numeric = False
+                self.skip()
+                n += 1
+            if numeric and n >= lazy_min:
+                return LazyArray(path, start, n)
+            self.seek(start)
+        return self.load()
+
+
+class LazyArray:
+    """Number array kept in a JSON file: byte offset of its '[' and length."""
+
+    def __init__(self, path: str, offset: int, length: int):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def load(self, typecode: str = "i", stream: JsonStream = None):
+        out = array(typecode)
+        if stream is not None:
+            stream.seek(self.offset)
+            return stream.read_numbers(out)
+        with open(self.path, "rb") as f:
+            s = JsonStream(f)
+            s.seek(self.offset)
+            return s.read_numbers(out)
+
+
+def resolve(value, typecode: str = "i"):
+    """Load a LazyArray; other values are returned unchanged."""
+    if isinstance(value, LazyArray):
+        return value.load(typecode)
+    return value
+
+
+def materialize(value):
+    """Deep copy of value with every LazyArray turned into a list (for JSON)."""
+    if isinstance(value, LazyArray):
+        return list(value.load())
+    if isinstance(value, dict):
+        return dict((k, materialize(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [materialize(v) for v in value]
+    return value
+
+
+def load_lazy(path: str, lazy_min: int, default=None):
+    """Load a JSON file, leaving large number arrays in place (LazyArray)."""
+    try:
+        with open(path, "rb") as f:
+            return JsonStream(f).build(lazy_min, path)
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+def _is_numbers(value):
+    for x in value:
+        if not isinstance(x, (int, float)) or isinstance(x, bool):
+            return False
+    return True
+
+
+def _dump(value, f, lazy_min, src, fixups, parent, key):
+    if isinstance(value, dict):
+        f.write(b"{")
+        first = True
+        for k, v in value.items():
+            if not first:
+                f.write(b",")
+            first = False
+            f.write(json.dumps(k).encode())
+            f.write(b":")
+            _dump(v, f, lazy_min, src, fixups, value, k)
+        f.write(b"}")
+    elif isinstance(value, LazyArray) or (
+        isinstance(value, list) and len(value) >= lazy_min and _is_numbers(value)
+    ):
+        nums = value.load(stream=src) if isinstance(value, LazyArray) else value
+        fixups.append((parent, key, f.tell(), len(nums)))
+        f.write(b"[")
+        f.write(",".join([str(x) for x in nums]).encode())
+        f.write(b"]")
+    elif isinstance(value, list):
+        f.write(b"[")
+        for i, v in enumerate(value):
+            if i:
+                f.write(b",")
+            _dump(v, f, lazy_min, src, fixups, value, i)
+        f.write(b"]")
+    else:
+        f.write(json.dumps(value).encode())
+
+
+def dump_lazy(value: dict, f, lazy_min: int, src: JsonStream = None):
+    """Write value as JSON to the binary file f.
+
+    LazyArrays are copied over from their file (read through src when given);
+    those and other number lists of at least lazy_min items are recorded as
+    (parent, key, offset, length) fixups, to be swapped for LazyArrays into
+    the new file once it has replaced the old one.
+    """
+    fixups = []
+    _dump(value, f, lazy_min, src, fixups, None, None)
+    return fixups
@@ -0,0 +1,240 @@
+import time
+
+from timers import _gen_id
+
+# Session states
+CAPTURING = "capturing"
+PAUSED = "paused"
+DONE = "done"
+TIMEOUT = "timeout"
+CANCELLED = "cancelled"
+FAILED = "error"
+
+_FINISHED = (DONE, TIMEOUT, CANCELLED, FAILED)
+
+
+class LearnManager:
+    """Background IR learning sessions.
+
+    - A session captures two presses (toggle variants 0 and 1) of one button
+    - With samples=N it captures 2N presses (alternating toggle variants) and
+      stores the per-edge median of each variant with a confidence score
+    - The IRQ-driven IR_GET receiver fills its preallocated ring while the
+      server keeps handling requests; tick() only copies finished bursts out
+    - Each capture has a timeout; sessions can be cancelled
+    - Only one session captures at a time (there is a single IR receiver)
+
+    Session schema (dict):
+      {
+        "id": str,
+        "device": str,
+        "command": str,
+        "state": "capturing" | "paused" | "done" | "timeout" | "cancelled" | "error",
+        "step": int,              # index of the press being captured
+        "presses": int,           # 2 * samples
+        "samples": int,
+        "timeout_ms": int,
+        "lengths": {"0": int, "1": int}?,
+        "confidence": {"0": float, "1": float}?,  # samples > 1 only
+        "rejected": int?,         # outlier captures dropped (samples > 1)
+        "error": str?
+      }
+    """
+
+    MAX_SAMPLES = 8
+
+    def __init__(self, ctx: dict, timeout_ms: int = 15000, gap_ms: int = 1000, keep: int = 4):
+        self._ctx = ctx
+        self._timeout_ms = int(timeout_ms)
+        self._gap_ms = int(gap_ms)
+        self._keep = max(1, int(keep))
+        # id -> session; _order keeps ids oldest first for eviction
+        self._sessions = {}
+        self._order = []
+        self._current = None
+        self._receiver = None
+        self._captures = []
+        self._deadline = 0
+
+    # ---- receiver ----
+    def _open_receiver(self):
+        from ir_rx.acquire import IR_GET
+        from protocols.ir import rx_pin
+
+        # The always-on listener owns the receiver pin otherwise
+        listener = self._ctx.get("listener")
+        if listener is not None:
+            listener.pause()
+        pin = rx_pin(self._ctx)
+        self._receiver = IR_GET(pin, display=bool(self._ctx.get("config", {}).get("debug")))
+
+    def _close_receiver(self):
+        if self._receiver is not None:
+            try:
+                self._receiver.close()
+            except Exception:
+                pass
+            self._receiver = None
+        listener = self._ctx.get("listener")
+        if listener is not None:
+            try:
+                listener.resume()
+            except Exception as e:
+                print("[learn] listener resume failed:", e)
+
+    def _led(self, on: bool):
+        led = self._ctx.get("led")
+        if not led:
+            return
+        if on:
+            led.on()
+        else:
+            led.off()
+
+    # ---- public API ----
+    def busy(self) -> bool:
+        return self._current is not None
+
+    def get(self, session_id: str):
+        return self._sessions.get(session_id)
+
+    def start(self, name: str, command: str, timeout_ms=None, samples=None):
+        """Start learning command for device name; returns (status, payload)."""
+        if self._current is not None:
+            return 409, {"error": "Learning already in progress", "id": self._current["id"]}
+
+        dev = self._ctx["devices"].get(name)
+        if dev and (dev.get("protocol") or "IR").upper() != "IR":
+            return 405, {"error": f"Protocol '{dev.get('protocol')}' does not support learning"}
+
+        try:
+            timeout_ms = max(1000, int(timeout_ms)) if timeout_ms is not None else self._timeout_ms
+        except Exception:
+            return 400, {"error": "Invalid 'timeout_ms' value"}
+        try:
+            samples = min(self.MAX_SAMPLES, max(1, int(samples))) if samples is not None else 1
+        except Exception:
+            return 400, {"error": "Invalid 'samples' value"}
+
+        s = {
+            "id": _gen_id(),
+            "device": name,
+            "command": command,
+            "state": CAPTURING,
+            "step": 0,
+            "presses": 2 * samples,
+            "samples": samples,
+            "timeout_ms": timeout_ms,
+        }
+        try:
+            self._open_receiver()
+        except Exception as e:
+            self._close_receiver()
+            return 500, {"error": "IR receiver unavailable: %s" % e}
+
+        self._remember(s)
+        self._current = s
+        self._captures = []
+        self._arm(time.ticks_ms())
+        print("[learn] waiting for '%s' on '%s'..." % (command, name))
+        return 202, s
+
+    def cancel(self, session_id: str) -> bool:
+        s = self._sessions.get(session_id)
+        if not s:
+            return False
+        if s is self._current:
+            self._finish(CANCELLED)
+        return True
+
+    # ---- engine ----
+    def next_due_ms(self):
+        """Poll interval while a session is active, else None."""
+        return 20 if self._current is not None else None
+
+    def tick(self):
+        """Advance the current session. Called from the server loop."""
+        s = self._current
+        if s is None:
+            return
+        now = time.ticks_ms()
+
+        if s["state"] == PAUSED:
+            if time.ticks_diff(now, self._deadline) >= 0:
+                self._arm(now)
+            return
+
+        rx = self._receiver
+        if rx is not None and rx.available():
+            # Compact copy frees the ring slot; conversion for JSON happens on save
+            self._captures.append(rx.copy())
+            self._led(False)
+            if len(self._captures) >= s["presses"]:
+                self._complete()
+            else:
+                # Ignore repeat frames of the previous press during the gap
+                s["state"] = PAUSED
+                s["step"] = len(self._captures)
+                self._deadline = time.ticks_add(now, self._gap_ms)
+            return
+
+        if time.ticks_diff(now, self._deadline) >= 0:
+            self._finish(TIMEOUT, "No IR signal received within %d ms" % s["timeout_ms"])
+
+    def _arm(self, now):
+        s = self._current
+        s["state"] = CAPTURING
+        self._receiver.rearm()
+        self._deadline = time.ticks_add(now, s["timeout_ms"])
+        self._led(True)
+
+    def _complete(self):
+        s = self._current
+        try:
+            from protocols.ir import store_learned, merge_captures
+            from protocols.dispatch import save_learned
+
+            confidence = None
+            if s["samples"] > 1:
+                # Presses alternate between the two toggle variants
+                first, c0, r0 = merge_captures(self._captures[0::2])
+                second, c1, r1 = merge_captures(self._captures[1::2])
+                confidence = {"0": c0, "1": c1}
+                s["confidence"] = confidence
+                s["rejected"] = r0 + r1
+            else:
+                first, second = self._captures[0], self._captures[1]
+
+            dev = self._ctx["devices"].get(s["device"])
+            if not dev:
+                dev = {"protocol": "IR", "ir": {"tx_freq": self._ctx.get("config", {}).get("ir", {}).get("tx_freq"), "commands": {}}}
+            s["lengths"] = store_learned(self._ctx, dev, s["command"], first, second, confidence)
+            save_learned(self._ctx, s["device"], dev, s["command"])
+        except Exception as e:
+            self._finish(FAILED, str(e))
+            return
+        self._finish(DONE)
+        led = self._ctx.get("led")
+        if led:
+            led.blink(times=3, period_ms=50)
+
+    def _finish(self, state: str, error: str = None):
+        s = self._current
+        s["state"] = state
+        if error:
+            s["error"] = error
+        self._close_receiver()
+        self._led(False)
+        self._current = None
+        self._captures = []
+        print("[learn]", s["device"], s["command"], "->", state)
+
+    def _remember(self, s):
+        self._sessions[s["id"]] = s
+        self._order.append(s["id"])
+        while len(self._order) > self._keep:
+            old = self._order[0]
+            if self._sessions.get(old, {}).get("state") not in _FINISHED:
+                break
+            self._order.pop(0)
+            self._sessions.pop(old, None)
@@ -0,0 +1,155 @@
+from journal import JournalStore
+from executor import DEFAULT_DELAY_MS, group_steps
+from protocols.dispatch import compile_command
+
+
+class MacroPlan:
+    """A macro compiled into executor steps of prebuilt TxJobs."""
+
+    def __init__(self, name: str, steps, groups, version: int):
+        self.name = name
+        self.steps = steps
+        self.groups = groups  # carrier freq -> largest buffer (Player asize)
+        self.version = version  # Devices store version compiled against
+
+    def air_time_ms(self):
+        total = 0
+        for s in self.steps:
+            for job in (s[0] if isinstance(s[0], tuple) else (s[0],)):
+                total += job.air_us
+        return (total + 999) // 1000
+
+    def summary(self):
+        return {
+            "steps": len(self.steps),
+            "parallel": len([s for s in self.steps if isinstance(s[0], tuple)]),
+            "groups": dict((str(f), n) for f, n in self.groups.items()),
+            "duration_ms": sum(s[3] for s in self.steps),
+            "air_time_ms": self.air_time_ms(),
+        }
+
+
+class MacroManager:
+    """Stored multi-device scenes ("amp on, CD input, deck play").
+
+    - Macros are kept in a JournalStore (macros.json + journal)
+    - Saving compiles every step into a TxJob (ready transmit buffers), so
+      errors show up at save time and a run does no device lookups
+    - Jobs are grouped by carrier frequency and every job of a group reserves
+      the group's largest buffer, so the shared Player is only re-created
+      when the frequency changes
+    - Plans are recompiled lazily when the devices store changed since
+    - run() hands the plan to the cooperative Executor
+
+    Macro schema (dict):
+      {
+        "name": str,
+        "steps": [ { "device": str, "command": str, "repetitions": int?, "delay_ms": int? }, ... ]
+      }
+    delay_ms is the time from a step's start to the next step (default 1000ms);
+    steps with delay_ms 0 form a parallel group with the following step(s):
+    jobs on different resources (IR emitter, GPIO pins) run side by side,
+    jobs sharing one keep their order.
+    """
+
+    def __init__(self, ctx: dict, filename: str = "macros.json", compact_bytes: int = 8192):
+        self._ctx = ctx
+        self._store = JournalStore(filename, compact_bytes)
+        self._plans = {}
+
+    # ---- compile ----
+    def _compile(self, name: str, macro: dict):
+        """Return (MacroPlan, None) or (None, (status, error payload))."""
+        steps_in = macro.get("steps")
+        if not isinstance(steps_in, list) or not steps_in:
+            return None, (400, {"error": "'steps' must be a non-empty list"})
+        compiled = []
+        groups = {}
+        for i, st in enumerate(steps_in):
+            if not isinstance(st, dict) or not st.get("device") or not st.get("command"):
+                return None, (400, {"error": "Step %d needs 'device' and 'command'" % i})
+            options = None
+            delay_ms = DEFAULT_DELAY_MS
+            try:
+                if st.get("repetitions") is not None:
+                    options = {"repetitions": max(1, int(st.get("repetitions")))}
+                if st.get("delay_ms") is not None:
+                    delay_ms = max(0, int(st.get("delay_ms")))
+            except Exception:
+                return None, (400, {"error": "Step %d: invalid 'repetitions' or 'delay_ms'" % i})
+            if i == len(steps_in) - 1:
+                delay_ms = 0
+            status, job = compile_command(self._ctx, st.get("device"), st.get("command"), options)
+            if status != 200:
+                err = {"error": "Step %d: %s" % (i, job.get("error") if isinstance(job, dict) else job)}
+                return None, (status, err)
+            if job.freq is not None:
+                groups[job.freq] = max(groups.get(job.freq, 0), job.asize)
+            compiled.append((job, delay_ms))
+        for job, _ in compiled:
+            if job.freq is not None:
+                job.asize = groups[job.freq]
+        return MacroPlan(name, group_steps(compiled), groups, self._ctx["devices"].version), None
+
+    def _plan(self, name: str):
+        plan = self._plans.get(name)
+        if plan is not None and plan.version == self._ctx["devices"].version:
+            return plan, None
+        macro = self._store.get(name)
+        if macro is None:
+            return None, (404, {"error": f"Unknown macro '{name}'"})
+        plan, err = self._compile(name, macro)
+        if plan is not None:
+            self._plans[name] = plan
+        return plan, err
+
+    # ---- public API ----
+    def list(self):
+        return self._store.data()
+
+    def get(self, name: str):
+        return self._store.get(name)
+
+    def put(self, name: str, macro: dict):
+        """Compile and store a macro; returns (status, payload)."""
+        plan, err = self._compile(name, macro)
+        if err:
+            return err
+        macro = {"name": name, "steps": macro.get("steps")}
+        self._store.put(name, macro)
+        self._plans[name] = plan
+        return 200, {"status": "saved", "macro": macro, "plan": plan.summary()}
+
+    def delete(self, name: str) -> bool:
+        self._plans.pop(name, None)
+        return self._store.delete(name) is not None
+
+    def run(self, name: str, client=None):
+        plan, err = self._plan(name)
+        if err:
+            return err
+        executor = self._ctx.get("executor")
+        if executor is None:
+            return 501, {"error": "Executor not available"}
+        admission = self._ctx.get("admission")
+        wait = 0
+        if admission is not None:
+            refused = admission.admit(client, plan.air_time_ms())
+            if refused:
+                return refused
+            wait = admission.delay_ms()
+        last = plan.steps[-1][0]
+        last_air = max(j.air_time_ms for j in (last if isinstance(last, tuple) else (last,)))
+        pid = executor.submit(plan.steps, "macro " + name, priority="macro")
+        if pid is None:
+            return 503, {"error": "Too many sequences running"}
+        summary = plan.summary()
+        # Until the last frame is out: steps are planned start-to-start
+        eta = wait + summary["duration_ms"] + last_air
+        return 202, {"status": "started", "macro": name, "plan_id": pid, "plan": summary, "eta_ms": eta}
+
+    def next_due_ms(self):
+        return self._store.next_due_ms()
+
+    def tick(self):
+        self._store.tick()  # Journal compaction
@@ -1,3 +1,9 @@
+import sys
+import time
+
+# The IR receive library imports itself as top-level ir_rx
+sys.path.append("/ir")
+
 import network
 from machine import Pin
 
@@ -8,15 +14,28 @@ from config import load_config
 from led import StatusLED
 from wifi import connect as wifi_connect
 from web.server import serve
+from web.streams import StreamManager
+from web.idempotency import IdempotencyCache
 from web.handlers import (
     health_handler,
+    metrics_handler,
     info_handler,
     config_get_handler,
     config_put_handler,
     ui_config_get_handler,
     ui_config_put_handler,
     device_send_handler,
+    device_batch_handler,
+    device_hold_start_handler,
+    device_hold_stop_handler,
+    udp_table_handler,
     device_setup_handler,
+    device_learn_start_handler,
+    device_learn_get_handler,
+    device_learn_cancel_handler,
+    ir_listen_get_handler,
+    ir_bindings_get_handler,
+    ir_bindings_put_handler,
     devices_list_handler,
     device_get_handler,
     device_put_handler,
@@ -25,11 +44,39 @@ from web.handlers import (
     timers_post_handler,
     timers_test_handler,
     timer_delete_handler,
+    macros_list_handler,
+    macro_get_handler,
+    macro_put_handler,
+    macro_delete_handler,
+    macro_run_handler,
 )
 from timers import TimerManager
+from scheduler import SchedStats
+from executor import Executor
+from learning import LearnManager
+from receiver import IRListener
+from storage import enable_write_behind
+from journal import JournalStore
+from macros import MacroManager
+from hold import HoldManager
+from coalesce import Coalescer
+from admission import Admission
+from udp import UdpRemote
+from core1 import TxWorker
+from transport import TransportScheduler
+
+
+def _phase(boot: dict, name: str, since: int) -> int:
+    now = time.ticks_ms()
+    boot[name + "_ms"] = time.ticks_diff(now, since)
+    return now
 
 
 def main():
+    # Boot phase timings for /health (ticks_ms counts from reset, so the
+    # first phase includes the interpreter start and the imports)
+    boot = {}
+    t = _phase(boot, "imports", 0)
     cfg = load_config()
 
     # Pins and IR
@@ -38,11 +85,25 @@ def main():
     ir_tx_pin = Pin(cfg["pins"]["ir_tx"], Pin.OUT, value=0)
     player = Player(ir_tx_pin, freq=cfg["ir"]["tx_freq"])  # 36kHz default
 
-    # Wi-Fi
+    t = _phase(boot, "config", t)
+
+    # Wi-Fi: cached access point and lease first, scan only as a fallback
     network.country('DE')
     wlan = network.WLAN(network.STA_IF)
-    ip_address = wifi_connect(wlan, secrets.SSID, secrets.PASSWORD, status_led=led)
+    boot["wifi"] = {}
+    ip_address = wifi_connect(
+        wlan,
+        secrets.SSID,
+        secrets.PASSWORD,
+        status_led=led,
+        cache_file=cfg["storage"].get("wifi_cache_filename", "wifi_cache.json"),
+        fast_timeout_ms=cfg.get("wifi", {}).get("fast_timeout_ms", 3000),
+        reuse_ip=cfg.get("wifi", {}).get("reuse_ip", False),
+        reuse_boots=cfg.get("wifi", {}).get("reuse_boots", 3),
+        report=boot["wifi"],
+    )
     print("Connected! Pico IP:", ip_address)
+    t = _phase(boot, "wifi", t)
 
     # Shared context for handlers
     context = {
@@ -50,6 +111,7 @@ def main():
         "led": led,
         "player": player,
         "player_freq": int(cfg["ir"]["tx_freq"]) if cfg.get("ir") and cfg["ir"].get("tx_freq") is not None else None,
+        "player_asize": 68,  # Player default
         "ir_tx_pin": ir_tx_pin,
         "wlan": wlan,
         "codes_filename": cfg["storage"]["codes_filename"],
@@ -57,14 +119,93 @@ def main():
         "ui_config_filename": cfg["storage"].get("ui_config_filename", "ui_config.json"),
         "toggle_bit": 0,
         "toggles": {},
+        "boot": boot,
     }
 
-    # Timers
-    timers = TimerManager(context, filename=cfg["storage"].get("timers_filename", "timers.json"))
+    # Deferred, coalesced JSON writes (UI config, bindings)
+    context["storage"] = enable_write_behind(
+        debounce_ms=cfg["storage"].get("write_debounce_ms", 1500),
+        max_delay_ms=cfg["storage"].get("write_max_delay_ms", 10000),
+    )
+    # Devices: snapshot + append-only journal, compacted from the server loop
+    compact_bytes = cfg["storage"].get("journal_compact_bytes", 8192)
+    # (learned timing lists are read from the snapshot on demand)
+    context["devices"] = JournalStore(cfg["storage"]["devices_filename"], compact_bytes, lazy_min=16)
+
+    # Timers (scheduling statistics are shared with the server loop)
+    context["sched_stats"] = SchedStats()
+    context["transports"] = TransportScheduler()  # Which transports (IR emitter, GPIO pins) are busy
+    # Optional: transmissions run on core 1, the network and services stay on core 0
+    if cfg.get("core1", {}).get("enabled"):
+        worker = TxWorker(context, size=cfg["core1"].get("ring_size", 16))
+        try:
+            worker.start()
+            context["core1"] = worker
+        except Exception as e:
+            print("Core 1 worker unavailable:", e)
+    # Runs timer/remote action sequences step by step, by priority class
+    context["executor"] = Executor(context, limits=cfg.get("queue"))
+    context["streams"] = StreamManager()  # Open streamed responses (device batches)
+    context["idempotency"] = IdempotencyCache(cfg["web"].get("idempotency_size", 16))  # Replays retried requests
+    context["admission"] = Admission(  # 503/429 backpressure for transmitting requests
+        context,
+        max_delay_ms=cfg.get("admission", {}).get("max_delay_ms", 3000),
+        rate_per_s=cfg.get("admission", {}).get("rate_per_s", 5),
+        burst=cfg.get("admission", {}).get("burst", 10),
+    )
+    context["coalescer"] = Coalescer(  # Merges rapid identical presses
+        context,
+        window_ms=cfg.get("coalesce", {}).get("window_ms", 250),
+        max_repetitions=cfg.get("coalesce", {}).get("max_repetitions", 16),
+    )
+    context["holds"] = HoldManager(  # Press-and-hold repeats
+        context,
+        deadman_ms=cfg.get("hold", {}).get("deadman_ms", 600),
+        max_ms=cfg.get("hold", {}).get("max_ms", 30000),
+    )
+    timers = TimerManager(
+        context,
+        filename=cfg["storage"].get("timers_filename", "timers.json"),
+        utc_offset_minutes=cfg.get("time", {}).get("utc_offset_minutes", 0),
+        compact_bytes=compact_bytes,
+    )
     context["timers"] = timers
 
+    # Macros: multi-device scenes compiled to transmit plans
+    context["macros"] = MacroManager(
+        context,
+        filename=cfg["storage"].get("macros_filename", "macros.json"),
+        compact_bytes=compact_bytes,
+    )
+
+    # Background IR learning sessions
+    context["learn"] = LearnManager(context, timeout_ms=cfg["ir"].get("learn_timeout_ms", 15000))
+
+    # Always-on IR receive mode (physical remotes trigger hub actions)
+    listener = IRListener(
+        context,
+        filename=cfg["storage"].get("ir_bindings_filename", "ir_bindings.json"),
+        protocols=cfg["ir"].get("listen_protocols"),
+    )
+    context["listener"] = listener
+    if cfg["ir"].get("listen"):
+        try:
+            listener.start()
+        except Exception as e:
+            print("IR listen mode unavailable:", e)
+
+    # Optional binary UDP path for remote buttons
+    if cfg.get("udp", {}).get("enabled"):
+        udp = UdpRemote(context, port=cfg["udp"].get("port", 4210), api_key=getattr(secrets, "API_KEY", None))
+        try:
+            udp.start()
+            context["udp"] = udp
+        except Exception as e:
+            print("UDP remote unavailable:", e)
+
     router = {
         ("GET", "/health"): health_handler,
+        ("GET", "/metrics"): metrics_handler,
         ("GET", "/info"): info_handler,
         ("GET", "/config"): config_get_handler,
         ("PUT", "/config"): config_put_handler,
@@ -73,7 +214,19 @@ def main():
     ("PUT", "/ui/config"): ui_config_put_handler,
         # Unified device operations (protocol-dispatched)
         ("GET", "/device/send"): device_send_handler,
+        ("POST", "/device/send"): device_send_handler,  # Same; retries can carry an Idempotency-Key
+        ("POST", "/device/batch"): device_batch_handler,
+        ("POST", "/device/hold/start"): device_hold_start_handler,
+        ("POST", "/device/hold/stop"): device_hold_stop_handler,
+        ("GET", "/udp/table"): udp_table_handler,
         ("POST", "/device/setup"): device_setup_handler,
+        ("POST", "/device/learn"): device_learn_start_handler,
+        ("GET", "/device/learn"): device_learn_get_handler,  # poll by ?id=
+        ("DELETE", "/device/learn"): device_learn_cancel_handler,  # cancel by ?id=
+        # IR listen mode
+        ("GET", "/ir/listen"): ir_listen_get_handler,
+        ("GET", "/ir/bindings"): ir_bindings_get_handler,
+        ("PUT", "/ir/bindings"): ir_bindings_put_handler,
         # Devices CRUD
         ("GET", "/devices"): devices_list_handler,
         ("GET", "/device"): device_get_handler,
@@ -84,8 +237,17 @@ def main():
         ("POST", "/timers"): timers_post_handler,
         ("POST", "/timers/test"): timers_test_handler,
         ("DELETE", "/timer"): timer_delete_handler,  # delete by ?id=
+        # Macros
+        ("GET", "/macros"): macros_list_handler,
+        ("GET", "/macro"): macro_get_handler,  # by ?name=
+        ("PUT", "/macro"): macro_put_handler,
+        ("DELETE", "/macro"): macro_delete_handler,  # by ?name=
+        ("POST", "/macro/run"): macro_run_handler,
     }
 
+    _phase(boot, "services", t)
+    boot["ready_ms"] = time.ticks_ms()
+    print("Boot:", boot)
     serve(cfg["web"]["port"], router, getattr(secrets, "API_KEY", None), context)
 
 
@@ -1,47 +1,115 @@
-from storage import read_json, write_json_atomic
-
-
-def _get_device(ctx, name):
-    devices = read_json(ctx.get("devices_filename"), {}) or {}
+def _get_device(ctx, name, devices=None):
+    if devices is None:
+        devices = ctx["devices"].data()
     return devices, devices.get(name)
 
 
-def send_command(ctx, name: str, command: str, options=None):
-    devices, dev = _get_device(ctx, name)
+def compile_command(ctx, name: str, command: str, options=None, devices=None):
+    """Compile a device command into a TxJob: (200, job) or (status, error).
+
+    Callers compiling many commands may pass the devices dict they already
+    looked up.
+    """
+    devices, dev = _get_device(ctx, name, devices)
     if not dev:
         return 404, {"error": f"Unknown device '{name}'"}
 
     protocol = (dev.get("protocol") or "IR").upper()
     if protocol == "IR":
-        from protocols.ir import send_ir
+        from protocols.ir import compile_ir
 
-        return send_ir(ctx, name, dev, command, options)
+        return compile_ir(ctx, name, dev, command, options)
     if protocol == "SAA3004":
-        from protocols.saa3004 import send_saa3004
-        return send_saa3004(ctx, name, dev, command, options)
+        from protocols.saa3004 import compile_saa3004
+        return compile_saa3004(ctx, name, dev, command, options)
     if protocol == "KENWOOD_XS8":
-        from protocols.kenwood_xs8 import send_kenwood_xs8
-        return send_kenwood_xs8(ctx, name, dev, command, options)
+        from protocols.kenwood_xs8 import compile_kenwood_xs8
+        return compile_kenwood_xs8(ctx, name, dev, command, options)
 
     return 501, {"error": f"Protocol '{protocol}' not implemented"}
 
 
+def transmit(ctx, job, on_done=None, direct: bool = False):
+    """Send a compiled TxJob; returns (status, payload).
+
+    The job's resources are marked busy in ctx["transports"] for its air time.
+    Successful payloads report air_time_ms (known from compilation) and
+    eta_ms, the time until the transmission has left the transport.
+
+    With the core-1 worker (ctx["core1"]) the job is only handed over and
+    the answer is 202 "queued"; on_done(status, payload) gets the real result
+    later from the server loop. Without it on_done is called right away.
+    direct=True always transmits on the calling core.
+    """
+    from scheduler import mono_ms
+
+    worker = None if direct else ctx.get("core1")
+    transports = ctx.get("transports")
+    started = mono_ms()
+    if worker is not None:
+        if not worker.submit(job, on_done):
+            return 503, {"error": "Transmit queue full", "retry_after_s": 1}
+        result = 202, {"status": "queued", "device": job.device, "command": job.command, "queued": worker.depth()}
+        on_done = None  # The worker reports the result
+    else:
+        result = _transmit(ctx, job)
+    if transports is None:
+        eta = 0 if job.blocking and worker is None else job.air_time_ms
+    else:
+        if result[0] in (200, 202):
+            # Offloaded blocking jobs no longer hold up this core
+            transports.note(job, started, offloaded=worker is not None)
+        eta = max([0] + [transports.free_in_ms(r) for r in job.resources])
+    result = _with_air(result, job, eta)
+    if on_done is not None:
+        on_done(*result)
+    return result
+
+
+def _with_air(result, job, eta_ms):
+    status, payload = result
+    if status in (200, 202) and isinstance(payload, dict):
+        payload["air_time_ms"] = job.air_time_ms
+        payload["eta_ms"] = eta_ms
+    return result
+
+
+def _transmit(ctx, job):
+    if job.protocol == "IR":
+        from protocols.ir import transmit_ir
+        return transmit_ir(ctx, job)
+    if job.protocol == "SAA3004":
+        from protocols.saa3004 import transmit_saa3004
+        return transmit_saa3004(ctx, job)
+    if job.protocol == "KENWOOD_XS8":
+        from protocols.kenwood_xs8 import transmit_kenwood_xs8
+        return transmit_kenwood_xs8(ctx, job)
+
+    return 501, {"error": f"Protocol '{job.protocol}' not implemented"}
+
+
+def send_command(ctx, name: str, command: str, options=None):
+    status, job = compile_command(ctx, name, command, options)
+    if status != 200:
+        return status, job
+    return transmit(ctx, job)
+
+
 def setup_command(ctx, name: str, command: str):
     devices, dev = _get_device(ctx, name)
     if not dev:
         # Auto-create IR device with default frequency if missing
         default_freq = ctx.get("config", {}).get("ir", {}).get("tx_freq")
         dev = {"protocol": "IR", "ir": {"tx_freq": default_freq, "commands": {}}}
-        devices[name] = dev
 
     protocol = (dev.get("protocol") or "IR").upper()
     if protocol == "IR":
         from protocols.ir import learn_ir
 
         status, payload = learn_ir(ctx, name, dev, command)
-        # Save updated device state (codes) if learn succeeded
+        # Record the learned codes if learn succeeded
         if status == 200:
-            write_json_atomic(ctx.get("devices_filename"), devices)
+            save_learned(ctx, name, dev, command)
         return status, payload
     if protocol == "SAA3004":
         from protocols.saa3004 import setup_saa3004
@@ -51,3 +119,12 @@ def setup_command(ctx, name: str, command: str):
         return setup_kenwood_xs8(ctx, name, dev, command)
 
     return 501, {"error": f"Protocol '{protocol}' not implemented"}
+
+
+def save_learned(ctx, name: str, dev: dict, command: str):
+    """Journal a learned IR command: one small entry for known devices."""
+    store = ctx["devices"]
+    if name in store:
+        store.set(name, ("ir", "commands", command), dev["ir"]["commands"][command])
+    else:
+        store.put(name, dev)
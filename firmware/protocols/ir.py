@@ -1,11 +1,18 @@
 import time
 
-from storage import read_json, write_json_atomic
+from jsonstream import resolve
+from protocols.job import TxJob, build_buffer
 try:
     import _thread
 except Exception:  # Fallback on platforms without _thread
     _thread = None
 
+IR_REPEAT_GAP_US = 27830  # Space between repetitions of a learned frame
+
+# NEC repeat code (as ir_tx.nec.NEC.repeat sends it) and its frame period
+NEC_REPEAT = (9000, 2250, 563)
+NEC_PERIOD_MS = 108
+
 
 def _led(ctx):
     return ctx.get("led")
@@ -14,8 +21,10 @@ def _led(ctx):
 def _get_player_for_freq(ctx, tx_freq, asize=136):
     """Return a shared Player configured for tx_freq.
 
-    - Reuse ctx["player"] when frequency matches the currently configured one.
-    - If frequency differs (or no player yet), recreate Player and store back in ctx.
+    - Reuse ctx["player"] when frequency matches the currently configured one
+      and its array holds at least asize times.
+    - If frequency differs, the array is too small (or no player yet), recreate
+      Player and store back in ctx.
     This ensures only one underlying RMT/PIO instance exists and avoids cross-protocol stomping.
     """
     from ir.ir_tx import Player
@@ -28,15 +37,50 @@ def _get_player_for_freq(ctx, tx_freq, asize=136):
     player = ctx.get("player")
     current_freq = ctx.get("player_freq")
 
-    if player is None or current_freq is None or int(current_freq) != int(target_freq):
+    if (
+        player is None
+        or current_freq is None
+        or int(current_freq) != int(target_freq)
+        or ctx.get("player_asize", 0) < asize
+    ):
         ir_tx_pin = ctx.get("ir_tx_pin")
         # Recreate and store as the single shared instance
+        asize = max(asize, ctx.get("player_asize", 0))
         player = Player(ir_tx_pin, freq=int(target_freq), asize=asize)
         ctx["player"] = player
         ctx["player_freq"] = int(target_freq)
+        ctx["player_asize"] = asize
     return player
 
 
+def rx_pin(ctx):
+    """Return the IR receiver input Pin and select the edge source.
+
+    With config ir.rx_pio the receivers measure pulse widths with an RP2 PIO
+    state machine instead of timestamping every edge in a pin IRQ. The
+    choice is class state of the library's own ir_rx.IR_RX (the one IR_GET
+    and the decoders derive from), so it is set, or reset, on every call.
+    """
+    from machine import Pin
+    from ir_rx import IR_RX
+
+    cfg = ctx.get("config", {})
+    ir_cfg = cfg.get("ir", {})
+    IR_RX.use_pio(int(ir_cfg.get("rx_pio_sm", 4)) if ir_cfg.get("rx_pio") else None)
+    return Pin(cfg.get("pins", {}).get("ir_rx", 16), Pin.IN)
+
+
+def _suppress_rx(ctx, timings, guard_ms=50):
+    """Mute the always-on IR listener while our own frame is on air."""
+    listener = ctx.get("listener")
+    if listener is None:
+        return
+    try:
+        listener.suppress(sum(timings) // 1000 + guard_ms)
+    except Exception:
+        pass
+
+
 def _get_ir_lock(ctx):
     """Get or create a shared IR transmit lock in ctx.
 
@@ -53,16 +97,15 @@ def _get_ir_lock(ctx):
     return lock
 
 
-def send_ir(ctx, device_name: str, device_entry: dict, command: str, options=None):
+def compile_ir(ctx, device_name: str, device_entry: dict, command: str, options=None):
+    """Build the transmit buffers (both toggle variants) for a learned command.
+
+    Returns (200, TxJob) or (status, error payload).
+    """
     ir_cfg = device_entry.get("ir") or {}
     tx_freq = ir_cfg.get("tx_freq") or ctx.get("config", {}).get("ir", {}).get("tx_freq")
     codes = (ir_cfg.get("commands") or {})
-
-    toggle_bit = ctx.get("toggle_bit", 0)
     entry = codes.get(command) or {}
-    timings = entry.get(str(toggle_bit))
-    if not timings:
-        return 404, {"error": f"No timings for command '{command}', toggle {toggle_bit}"}
 
     # repetitions override
     reps = 2  # preserve previous behavior of sending twice by default
@@ -72,15 +115,37 @@ def send_ir(ctx, device_name: str, device_entry: dict, command: str, options=Non
     except Exception:
         reps = 2
 
-    # Build concatenated timings for the requested repetitions.
-    # Each repetition uses the same toggle variant within this call.
-    timings_to_send = []
-    for i in range(reps):
-        timings_to_send.extend(timings)
-        if i != reps - 1:
-            timings_to_send.append(27830)  # Inter-frame gap
+    # Each repetition uses the same toggle variant within one send.
+    frames = []
+    for bit in ("0", "1"):
+        timings = resolve(entry.get(bit))  # Lazily stored timings are read now
+        frames.append(build_buffer(timings, reps, IR_REPEAT_GAP_US) if timings else None)
+    if frames[0] is None and frames[1] is None:
+        return 404, {"error": f"No timings for command '{command}'"}
+    return 200, TxJob("IR", device_name, command, frames, freq=tx_freq, reps=reps)
+
+
+def _near(value, target, tolerance=0.25):
+    return abs(value - target) <= tolerance * target
+
+
+def is_nec(timings):
+    """True when learned timings look like a full NEC frame: 9ms/4.5ms
+    leader, 32 bits and the closing burst (67 edges).
+
+    A buffer that went through the RP2 RMT already carries the 1us space it
+    appends after a trailing mark; that slot is not counted.
+    """
+    n = 0
+    while n < len(timings) and timings[n]:  # Stop at the buffer's zero slots
+        n += 1
+    if n == 68 and timings[67] == 1:
+        n = 67
+    return n == 67 and _near(timings[0], 9000) and _near(timings[1], 4500)
+
 
-    #print(timings_to_send)
+def play_job(ctx, job, buf):
+    """Send one compiled carrier buffer on the shared Player (LED, lock, RX mute)."""
     led = _led(ctx)
     lock = _get_ir_lock(ctx)
     try:
@@ -89,10 +154,9 @@ def send_ir(ctx, device_name: str, device_entry: dict, command: str, options=Non
         # Serialize send if lock exists
         if lock:
             lock.acquire()
-        player = _get_player_for_freq(ctx, tx_freq, asize=136)
-        #print("[IR] sending '%s' for device '%s' at %s Hz (toggle %s)" % (command, device_name, tx_freq, toggle_bit))
-        player.play(timings_to_send)
-        #print("[IR] sent")
+        player = _get_player_for_freq(ctx, job.freq, asize=job.asize)
+        _suppress_rx(ctx, buf)
+        player.play_buffer(buf)
     finally:
         if lock:
             try:
@@ -102,19 +166,118 @@ def send_ir(ctx, device_name: str, device_entry: dict, command: str, options=Non
         if led:
             led.off()
 
+
+def transmit_ir(ctx, job):
+    toggle_bit = ctx.get("toggle_bit", 0)
+    buf = job.frames[toggle_bit]
+    if buf is None:
+        return 404, {"error": f"No timings for command '{job.command}', toggle {toggle_bit}"}
+    play_job(ctx, job, buf)
     ctx["toggle_bit"] = 1 - toggle_bit
-    return 200, {"status": "success", "device": device_name, "command": command, "repetitions": reps, "toggle_next": ctx["toggle_bit"]}
+    return 200, {"status": "success", "device": job.device, "command": job.command, "repetitions": job.reps, "toggle_next": ctx["toggle_bit"]}
 
 
-def learn_ir(ctx, device_name: str, device_entry: dict, command: str):
-    from ir.ir_rx.acquire import test as ir_acquire_test
+def send_ir(ctx, device_name: str, device_entry: dict, command: str, options=None):
+    status, job = compile_ir(ctx, device_name, device_entry, command, options)
+    if status != 200:
+        return status, job
+    return transmit_ir(ctx, job)
 
-    # Ensure structure exists
+
+def _ensure_ir_entry(ctx, device_entry: dict):
+    """Make sure device_entry carries an 'ir' section with commands and tx_freq."""
     device_entry.setdefault("ir", {})
     device_entry["ir"].setdefault("commands", {})
     if "tx_freq" not in device_entry["ir"]:
         device_entry["ir"]["tx_freq"] = ctx.get("config", {}).get("ir", {}).get("tx_freq")
+    return device_entry["ir"]
+
+
+def store_learned(ctx, device_entry: dict, command: str, first, second, confidence=None):
+    """Store both captured toggle variants for command; returns their lengths.
+
+    Captures may be arrays or memoryviews; they are stored as JSON lists.
+    confidence ({"0": float, "1": float}) is kept alongside when multi-sample
+    learning produced the timings.
+    """
+    ir_cfg = _ensure_ir_entry(ctx, device_entry)
+    entry = {"0": list(first), "1": list(second)}
+    if confidence:
+        entry["confidence"] = confidence
+    ir_cfg["commands"][command] = entry
+    return {"0": len(first), "1": len(second)}
+
+
+def _median(values):
+    v = sorted(values)
+    n = len(v)
+    if n & 1:
+        return v[n // 2]
+    return (v[n // 2 - 1] + v[n // 2]) // 2
+
+
+def merge_captures(samples, tolerance=0.25):
+    """Merge several captures of the same button into one timing list.
+
+    - Captures are aligned by edge index; those whose edge count differs from
+      the most common one are rejected
+    - A capture with any edge more than tolerance away from the per-edge
+      median is rejected as an outlier (unless that would reject them all)
+    - The stored timing is the per-edge median of the accepted captures
+
+    Returns (timings, confidence, rejected). confidence is in 0..1: the share
+    of accepted captures times one minus their mean relative deviation.
+    """
+    if not samples:
+        return [], 0.0, 0
+    counts = {}
+    for smp in samples:
+        counts[len(smp)] = counts.get(len(smp), 0) + 1
+    length = 0
+    best = 0
+    for n, c in counts.items():
+        if c > best or (c == best and n > length):
+            length, best = n, c
+    aligned = [smp for smp in samples if len(smp) == length]
+
+    med = [_median([smp[i] for smp in aligned]) for i in range(length)]
+    accepted = []
+    for smp in aligned:
+        ok = True
+        for i in range(length):
+            if abs(smp[i] - med[i]) > tolerance * max(med[i], 1):
+                ok = False
+                break
+        if ok:
+            accepted.append(smp)
+    if not accepted:
+        accepted = aligned
+    elif len(accepted) != len(aligned):
+        med = [_median([smp[i] for smp in accepted]) for i in range(length)]
+
+    dev = 0.0
+    for smp in accepted:
+        for i in range(length):
+            dev += abs(smp[i] - med[i]) / max(med[i], 1)
+    dev /= max(1, len(accepted) * length)
+    confidence = (len(accepted) / len(samples)) * max(0.0, 1.0 - dev)
+    return med, round(confidence, 3), len(samples) - len(accepted)
 
+
+def _acquire(ctx):
+    """Block until one frame is captured on the configured receiver."""
+    from ir_rx.acquire import IR_GET
+
+    irg = IR_GET(rx_pin(ctx), display=bool(ctx.get("config", {}).get("debug")))
+    try:
+        return irg.acquire()  # Closes the receiver once a frame is in
+    except BaseException:
+        irg.close()
+        raise
+
+
+def _learn_pair(ctx, device_name: str, command: str):
+    """Capture both toggle variants (two presses) with LED prompts."""
     led = _led(ctx)
     if led:
         led.off(); time.sleep(0.2); led.on(); time.sleep(0.2); led.off()
@@ -123,7 +286,7 @@ def learn_ir(ctx, device_name: str, device_entry: dict, command: str):
         print("[IR] learning first toggle for '%s' on '%s'..." % (command, device_name))
         if led:
             led.on()
-        first = ir_acquire_test()
+        first = _acquire(ctx)
     finally:
         if led:
             led.off()
@@ -133,14 +296,34 @@ def learn_ir(ctx, device_name: str, device_entry: dict, command: str):
         if led:
             led.on()
         print("[IR] learning second toggle for '%s' on '%s'..." % (command, device_name))
-        second = ir_acquire_test()
+        second = _acquire(ctx)
     finally:
         if led:
             led.off()
+    return first, second
+
+
+def learn_ir(ctx, device_name: str, device_entry: dict, command: str):
+    # Ensure structure exists
+    _ensure_ir_entry(ctx, device_entry)
 
-    device_entry["ir"]["commands"][command] = {"0": first, "1": second}
+    # The always-on listener owns the receiver pin otherwise
+    listener = ctx.get("listener")
+    if listener is not None:
+        listener.pause()
+    try:
+        first, second = _learn_pair(ctx, device_name, command)
+    finally:
+        if listener is not None:
+            try:
+                listener.resume()
+            except Exception as e:
+                print("[IR] listener resume failed:", e)
+
+    lengths = store_learned(ctx, device_entry, command, first, second)
 
+    led = _led(ctx)
     if led:
         led.blink(times=3, period_ms=50)
 
-    return 200, {"status": "success", "device": device_name, "command": command, "lengths": {"0": len(first), "1": len(second)}}
+    return 200, {"status": "success", "device": device_name, "command": command, "lengths": lengths}
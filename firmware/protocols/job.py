@@ -0,0 +1,60 @@
+from array import array
+
+IR_EMITTER = "ir"  # Resource name of the shared IR LED/Player
+
+
+class TxJob:
+    """A command compiled into ready-to-send buffers.
+
+    - frames: one buffer per toggle variant (None when a variant is missing);
+      carrier protocols use array('H') of mark/space times followed by two
+      zero slots (STOP plus room for the transmitter's closing space)
+    - freq: carrier frequency, None for wired protocols
+    - asize: minimum Player array size to reserve (macro plans raise it to the
+      largest buffer of their frequency group)
+    - resources: physical resources the transmission occupies (IR_EMITTER,
+      "gpio:<n>", ...); jobs sharing one are serialized (transport.py)
+    - blocking: transmit() returns only after the transmission; otherwise
+      it runs on in hardware for air_us
+    - air_us: exact time on air (timings incl. repetitions and gaps, or the
+      wired protocol's bit timing), known at compile time; the executor,
+      transports and admission control plan with it
+    - info: protocol specific details for the response
+    """
+
+    def __init__(self, protocol: str, device: str, command, frames, freq=None, reps: int = 1, info=None,
+                 resources=None, blocking: bool = False, air_us: int = None):
+        self.protocol = protocol
+        self.device = device
+        self.command = command
+        self.frames = frames
+        self.freq = freq
+        self.reps = reps
+        self.info = info or {}
+        self.asize = max([len(f) for f in frames if f is not None] or [0])
+        self.resources = resources if resources is not None else (IR_EMITTER,)
+        self.blocking = blocking
+        if air_us is None:
+            air_us = max([sum(f) for f in frames if f is not None] or [0])
+        self.air_us = air_us
+
+    @property
+    def air_time_ms(self) -> int:
+        return (self.air_us + 999) // 1000
+
+
+def build_buffer(timings, reps: int = 1, gap_us: int = 0):
+    """Concatenate reps copies of timings (gap_us between them) into a
+    transmit buffer: array('H') ending with two zero slots."""
+    n = len(timings)
+    size = n * reps + (reps - 1 if gap_us else 0)
+    buf = array("H", bytes(2 * (size + 2)))
+    i = 0
+    for r in range(reps):
+        if r and gap_us:
+            buf[i] = gap_us
+            i += 1
+        for t in timings:
+            buf[i] = min(0xFFFF, int(t))
+            i += 1
+    return buf
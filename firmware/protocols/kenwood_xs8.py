@@ -1,6 +1,9 @@
 import time
+from array import array
 from machine import Pin
 
+from protocols.job import TxJob
+
 
 # --- Protocol Timing Constants (in microseconds) ---
 # Converted from the provided Raspberry Pi (seconds) values
@@ -87,19 +90,11 @@ def _resolve_pins(dev):
     return ctrl_pin, sdat_pin, cfg
 
 
-def send_kenwood_xs8(ctx, device_name, dev, command, options=None):
-    """Send a Kenwood XS8 command over two GPIO pins with tight timing.
+def compile_kenwood_xs8(ctx, device_name, dev, command, options=None):
+    """Resolve pins/code and precompute the wait sequence of one frame.
 
-    Device configuration example (PUT /device):
-      {
-        "name": "deck",
-        "protocol": "KENWOOD_XS8",
-        "kenwood_xs8": {
-          "ctrl_pin": 14,
-          "sdat_pin": 15,
-          "commands": { "play": 121, "stop": 68 }
-        }
-      }
+    The frame buffer holds: pre-start, start-high, 8 x (bit low, frame high),
+    post-ctrl-low and the inter-command idle, all in µs.
     """
     ctrl_pin_num, sdat_pin_num, cfg = _resolve_pins(dev)
     if ctrl_pin_num is None or sdat_pin_num is None:
@@ -127,46 +122,82 @@ def send_kenwood_xs8(ctx, device_name, dev, command, options=None):
     except Exception:
         reps = 1
 
+    # Protocol requires inverted data byte
+    inverted_byte = (~int(code)) & 0xFF
+
+    frame = array("I", (pre_us, start_high_us))
+    for i in range(7, -1, -1):
+        bit = (inverted_byte >> i) & 0x1
+        frame.append(bit1_low_us if bit == 1 else bit0_low_us)
+        frame.append(frame_high_us)
+    frame.append(post_low_us)
+    frame.append(2000)  # Small inter-command idle before repeating
+
+    info = {"code": int(code), "pins": (ctrl_pin_num, sdat_pin_num)}
+    resources = ("gpio:%d" % int(ctrl_pin_num), "gpio:%d" % int(sdat_pin_num))
+    return 200, TxJob(
+        "KENWOOD_XS8", device_name, command, (frame,), reps=reps, info=info,
+        resources=resources, blocking=True, air_us=sum(frame) * reps,
+    )
+
+
+def transmit_kenwood_xs8(ctx, job):
+    """Send a compiled Kenwood XS8 frame over two GPIO pins with tight timing."""
+    ctrl_pin_num, sdat_pin_num = job.info["pins"]
+    frame = job.frames[0]
+
     # Prepare pins fresh on each call to reduce global state/timing interference
     ctrl = Pin(ctrl_pin_num, Pin.OUT, value=0)
     sdat = Pin(sdat_pin_num, Pin.OUT, value=0)
 
-    # Protocol requires inverted data byte
-    inverted_byte = (~int(code)) & 0xFF
-
-    for _ in range(reps):
+    for _ in range(job.reps):
         # Start sequence
         ctrl.value(1)
-        _busy_wait_us(pre_us)
+        _busy_wait_us(frame[0])
         sdat.value(1)
-        _busy_wait_us(start_high_us)
+        _busy_wait_us(frame[1])
 
-        for i in range(7, -1, -1):
-            bit = (inverted_byte >> i) & 0x1
+        for i in range(2, 18, 2):
             sdat.value(0)
-            if bit == 1:
-                _busy_wait_us(bit1_low_us)
-            else:
-                _busy_wait_us(bit0_low_us)
+            _busy_wait_us(frame[i])
             sdat.value(1)
-            _busy_wait_us(frame_high_us)
+            _busy_wait_us(frame[i + 1])
 
         ctrl.value(0)
-        _busy_wait_us(post_low_us)
+        _busy_wait_us(frame[18])
         sdat.value(0)
-        # Small inter-command idle before repeating
-        _busy_wait_us(2000)
+        _busy_wait_us(frame[19])
 
     return 200, {
         "status": "success",
-        "device": device_name,
+        "device": job.device,
         "protocol": "KENWOOD_XS8",
-        "command": command,
-        "code": int(code),
-        "repetitions": reps,
+        "command": job.command,
+        "code": job.info["code"],
+        "repetitions": job.reps,
     }
 
 
+def send_kenwood_xs8(ctx, device_name, dev, command, options=None):
+    """Send a Kenwood XS8 command over two GPIO pins with tight timing.
+
+    Device configuration example (PUT /device):
+      {
+        "name": "deck",
+        "protocol": "KENWOOD_XS8",
+        "kenwood_xs8": {
+          "ctrl_pin": 14,
+          "sdat_pin": 15,
+          "commands": { "play": 121, "stop": 68 }
+        }
+      }
+    """
+    status, job = compile_kenwood_xs8(ctx, device_name, dev, command, options)
+    if status != 200:
+        return status, job
+    return transmit_kenwood_xs8(ctx, job)
+
+
 def setup_kenwood_xs8(ctx, device_name, dev, command):
     # No learning/setup flow; configuration is static via device PUT
     return 405, {"error": "KENWOOD_XS8 is encoded; configure pins and optional map via PUT /device"}
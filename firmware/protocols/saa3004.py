@@ -1,5 +1,6 @@
 import time
-from protocols.ir import _get_player_for_freq, _get_ir_lock
+from protocols.ir import play_job
+from protocols.job import TxJob, build_buffer
 
 # --- CONFIGURATION BASED ON SAA3004 DATA SHEET ---
 
@@ -86,7 +87,22 @@ def _get_freq(ctx, dev):
         return 33333
 
 
-def send_saa3004(ctx, device_name, dev, command, options=None):
+def _frame_timings(frame_bits):
+    timings = []
+    for bit in frame_bits:
+        timings.append(int(PULSE_US))
+        if bit == '0':
+            timings.append(GAP_0_US)
+        else: # bit == '1'
+            timings.append(GAP_1_US)
+
+    timings.append(int(PULSE_US))
+    timings.append(int(TW-int(sum(timings))))
+    return timings
+
+
+def compile_saa3004(ctx, device_name, dev, command, options=None):
+    """Encode both toggle variants of command into transmit buffers."""
     # Resolve settings
     proto_cfg = dev.get("saa3004") or {}
     mapping = proto_cfg.get("commands") or {}
@@ -97,18 +113,10 @@ def send_saa3004(ctx, device_name, dev, command, options=None):
     # In different docs this may be called sub-address; keep alias 'address'
     sub_address = int(proto_cfg.get("sub_address", proto_cfg.get("address", 2)))
 
-    # 1-bit toggle value per device (snippet-style)
-    toggle = ctx.setdefault("toggle", {})
-    toggle_t0 = int(toggle.get(device_name, 0)) & 0x1
-
     ref_bit = '1'
-    t0_bit = '1' if toggle_t0 else '0'
-
     sub_address_bits = f'{sub_address:03b}'
     command_bits = f'{code:06b}'
 
-    frame_bits = ref_bit + t0_bit + sub_address_bits + command_bits
-
     # repetitions can be overridden by options
     repetitions = int(proto_cfg.get("repetitions", 1))
     try:
@@ -117,43 +125,39 @@ def send_saa3004(ctx, device_name, dev, command, options=None):
     except Exception:
         pass
 
-    timings_combined = []
-    for rep in range(repetitions):
-        timings = []
-        for bit in frame_bits:
-            timings.append(int(PULSE_US))
-            if bit == '0':
-                timings.append(GAP_0_US)
-            else: # bit == '1'
-                timings.append(GAP_1_US)
+    # One frame per value of the 1-bit toggle (snippet-style)
+    bits = []
+    frames = []
+    for t0_bit in ('0', '1'):
+        frame_bits = ref_bit + t0_bit + sub_address_bits + command_bits
+        bits.append(frame_bits)
+        frames.append(build_buffer(_frame_timings(frame_bits), repetitions))
 
-        timings.append(int(PULSE_US))
-        timings.append(int(TW-int(sum(timings))))
-        timings_combined.extend(timings)
+    info = {"sub_address": sub_address, "code": code, "bits": bits}
+    return 200, TxJob("SAA3004", device_name, command, frames, freq=_get_freq(ctx, dev), reps=repetitions, info=info)
 
-    freq = _get_freq(ctx, dev)
-    player = _get_player_for_freq(ctx, freq, asize=138)
 
-    # Serialize with shared lock to avoid overlap with other protocols
-    lock = _get_ir_lock(ctx)
-    if lock:
-        lock.acquire()
-    try:
-        # Send via shared Player at required frequency
-        player.play(timings_combined)
-    finally:
-        if lock:
-            try:
-                lock.release()
-            except Exception:
-                pass
-
-    toggle[device_name] = not toggle_t0
+def transmit_saa3004(ctx, job):
+    # 1-bit toggle value per device
+    toggle = ctx.setdefault("toggle", {})
+    toggle_t0 = int(toggle.get(job.device, 0)) & 0x1
+
+    # Send via shared Player at required frequency, serialized with other protocols
+    play_job(ctx, job, job.frames[toggle_t0])
+
+    toggle[job.device] = not toggle_t0
     return 200, {
-        "status": "success", "device": device_name, "protocol": "SAA3004",
-        "sub_address": sub_address, "code": code, "toggle_next": toggle[device_name], "freq": freq, "bits": frame_bits, "repetitions": repetitions
+        "status": "success", "device": job.device, "protocol": "SAA3004",
+        "sub_address": job.info["sub_address"], "code": job.info["code"], "toggle_next": toggle[job.device], "freq": job.freq, "bits": job.info["bits"][toggle_t0], "repetitions": job.reps
     }
 
+
+def send_saa3004(ctx, device_name, dev, command, options=None):
+    status, job = compile_saa3004(ctx, device_name, dev, command, options)
+    if status != 200:
+        return status, job
+    return transmit_saa3004(ctx, job)
+
 def setup_saa3004(ctx, device_name, dev, command):
     # SAA3004 is encoded, not learned; support only mapping updates via device PUT.
     return 405, {"error": "SAA3004 is encoded; use PUT /device to configure 'saa3004.commands' or send by 6-bit code."}
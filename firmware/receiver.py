@@ -0,0 +1,270 @@
+import time
+from array import array
+
+from storage import read_json, write_json
+
+# Decoders usable in listen mode: name -> (module, class). Modules are
+# named the way the ir_rx library imports itself, so they share its IR_RX
+# class (and its edge source, see protocols.ir.rx_pin). The position in
+# PROTOCOLS is part of the lookup key, so only append to it.
+PROTOCOLS = ("NEC_8", "NEC_16", "SAMSUNG", "SONY_12", "SONY_15", "SONY_20", "RC5_IR", "RC6_M0", "MCE")
+_MODULES = {
+    "NEC_8": "ir_rx.nec",
+    "NEC_16": "ir_rx.nec",
+    "SAMSUNG": "ir_rx.nec",
+    "SONY_12": "ir_rx.sony",
+    "SONY_15": "ir_rx.sony",
+    "SONY_20": "ir_rx.sony",
+    "RC5_IR": "ir_rx.philips",
+    "RC6_M0": "ir_rx.philips",
+    "MCE": "ir_rx.mce",
+}
+DEFAULT_PROTOCOLS = ("NEC_16", "SONY_20", "RC5_IR", "RC6_M0", "MCE")
+
+_REPEAT = -1  # IR_RX.REPEAT (NEC repeat code)
+_GAP_US = 10000  # Longer spaces end a frame (gap before a repeat)
+
+
+def binding_key(proto_idx: int, addr: int, cmd: int) -> int:
+    """Pack (protocol, addr, cmd) into one small int used as dict key."""
+    return (proto_idx << 24) | ((addr & 0xFFFF) << 8) | (cmd & 0xFF)
+
+
+class IRListener:
+    """Always-on IR receive mode: presses on physical remotes trigger actions.
+
+    - One raw capture (IR_RX) owns the receiver pin; each finished burst is
+      fed to the configured decoders (NEC_*, SONY_*, RC5_IR, RC6_M0, MCE)
+    - Decoded frames go through a preallocated ring buffer (written from the
+      decoder callback, soft IRQ context) and are handled in tick()
+    - (protocol, addr, cmd) is looked up in a dict of bindings; a binding runs
+      its actions through TimerManager.test()
+    - Frames are dropped while the hub itself transmits (see suppress()) and
+      the receiver is released while a learning session needs it
+
+    Binding schema (dict), stored as a list in ir_bindings.json:
+      {
+        "protocol": "NEC_16",
+        "addr": int,
+        "cmd": int,
+        "repeat": bool?,          # also fire on NEC repeat codes (held button)
+        "device": str, "command": str, "repetitions": int?,   # single command
+        "actions": [ { "device": str, "action": str, "repetitions": int?, "delay_ms": int? } ]?
+      }
+    """
+
+    def __init__(self, ctx: dict, filename: str = "ir_bindings.json", protocols=None, size: int = 16):
+        self._ctx = ctx
+        self._filename = filename
+        names = [p for p in (protocols or DEFAULT_PROTOCOLS) if p in _MODULES]
+        self._protocols = names
+        self._size = size
+        # Ring buffer: key and repeat flag per entry. head/tail are counters.
+        self._keys = array("i", (0 for _ in range(size)))
+        self._reps = array("b", (0 for _ in range(size)))
+        self._head = 0
+        self._tail = 0
+        self._last_key = -1  # For NEC repeat codes
+        self._mute_until = time.ticks_ms()
+        self._hit = False
+        self.dropped = 0
+        self.last = None
+        self.enabled = False
+        self._paused = 0  # Nested pause() calls (learning in progress)
+        self._capture = None
+        self._decoders = []
+        self._bindings = []
+        self._table = {}
+        self._load()
+
+    # ---- bindings ----
+    def _load(self):
+        data = read_json(self._filename, []) or []
+        self._set_bindings(data if isinstance(data, list) else [])
+
+    def _set_bindings(self, bindings):
+        table = {}
+        for b in bindings:
+            try:
+                idx = PROTOCOLS.index(b.get("protocol"))
+                table[binding_key(idx, int(b.get("addr")), int(b.get("cmd")))] = b
+            except Exception:
+                pass
+        self._bindings = bindings
+        self._table = table
+
+    def bindings(self):
+        return self._bindings
+
+    def set_bindings(self, bindings):
+        """Validate, persist and activate a new list of bindings.
+
+        Returns None on success or an error message.
+        """
+        if not isinstance(bindings, list):
+            return "Expected JSON list of bindings"
+        for b in bindings:
+            if not isinstance(b, dict):
+                return "Each binding must be an object"
+            if b.get("protocol") not in PROTOCOLS:
+                return "Unknown protocol '%s'; expected one of %s" % (b.get("protocol"), ", ".join(PROTOCOLS))
+            try:
+                int(b.get("addr"))
+                int(b.get("cmd"))
+            except Exception:
+                return "Binding needs integer 'addr' and 'cmd'"
+            if not (b.get("device") and b.get("command")) and not isinstance(b.get("actions"), list):
+                return "Binding needs 'device' and 'command' or an 'actions' list"
+        write_json(self._filename, bindings)
+        self._set_bindings(bindings)
+        return None
+
+    # ---- receiver ----
+    def start(self):
+        self.enabled = True
+        if not self._paused:
+            self._open()
+
+    def stop(self):
+        self.enabled = False
+        self._close()
+
+    # Learning needs the receiver pin; pause/resume keep the mode setting.
+    # Pauses nest: the listener reopens after the last resume().
+    def pause(self):
+        self._paused += 1
+        self._close()
+
+    def resume(self):
+        self._paused = max(0, self._paused - 1)
+        if self.enabled and not self._paused:
+            self._open()
+
+    def _open(self):
+        if self._capture is not None:
+            return
+        from ir_rx import IR_RX
+        from protocols.ir import rx_pin
+
+        verbose = bool(self._ctx.get("config", {}).get("debug"))
+        if not self._decoders:
+            for i, name in enumerate(PROTOCOLS):
+                if name not in self._protocols:
+                    continue
+                mod = __import__(_MODULES[name], None, None, (name,))
+                dec = getattr(mod, name)(None, self._on_frame, i)
+                dec.verbose = verbose
+                self._decoders.append(dec)
+
+        listener = self
+
+        class _Capture(IR_RX):
+            # Longest supported block: NEC, 68 edges in <= 80ms
+            def __init__(self, pin):
+                super().__init__(pin, 100, 80, lambda *_: None)
+
+            def decode(self, _):
+                listener._decode(self)
+
+        self._capture = _Capture(rx_pin(self._ctx))
+        self._capture.verbose = verbose
+
+    def _close(self):
+        if self._capture is not None:
+            try:
+                self._capture.close()
+            except Exception:
+                pass
+            self._capture = None
+
+    def suppress(self, ms: int):
+        """Drop frames for the next ms milliseconds (hub is transmitting)."""
+        until = time.ticks_add(time.ticks_ms(), int(ms))
+        if time.ticks_diff(until, self._mute_until) > 0:
+            self._mute_until = until
+
+    # ---- soft IRQ context ----
+    def _decode(self, cap):
+        times = cap._times
+        edge = cap.edge
+        # Keep only the first frame: stop at the gap before a repeat
+        for x in range(2, edge):
+            if time.ticks_diff(times[x], times[x - 1]) > _GAP_US:
+                edge = x
+                break
+        if edge >= 4 and time.ticks_diff(self._mute_until, time.ticks_ms()) <= 0:
+            self._hit = False
+            for dec in self._decoders:
+                dec.feed(times, edge)
+                if self._hit:  # Set by _on_frame
+                    break
+        cap.do_callback(0, 0, 0)
+
+    def _on_frame(self, cmd, addr, ext, proto_idx):
+        self._hit = True
+        if cmd == _REPEAT:
+            key = self._last_key
+            rep = 1
+        else:
+            key = binding_key(proto_idx, addr, cmd)
+            self._last_key = key
+            rep = 0
+        if key < 0:
+            return
+        if self._head - self._tail >= self._size:
+            self.dropped += 1
+            return
+        i = self._head % self._size
+        self._keys[i] = key
+        self._reps[i] = rep
+        self._head += 1
+
+    # ---- engine ----
+    def next_due_ms(self):
+        """0 when frames are pending, a short poll while receiving, else None."""
+        if self._tail != self._head:
+            return 0
+        return 50 if self._capture is not None else None
+
+    def tick(self):
+        """Handle received frames. Called from the server loop."""
+        while self._tail != self._head:
+            i = self._tail % self._size
+            key = self._keys[i]
+            rep = self._reps[i]
+            self._tail += 1
+            self._handle(key, rep)
+
+    def _handle(self, key, rep):
+        proto = PROTOCOLS[key >> 24] if (key >> 24) < len(PROTOCOLS) else None
+        b = self._table.get(key)
+        self.last = {
+            "protocol": proto,
+            "addr": (key >> 8) & 0xFFFF,
+            "cmd": key & 0xFF,
+            "repeat": bool(rep),
+            "bound": b is not None,
+        }
+        if b is None or (rep and not b.get("repeat")):
+            return
+        actions = b.get("actions")
+        if not isinstance(actions, list):
+            actions = [{"device": b.get("device"), "action": b.get("command"), "repetitions": b.get("repetitions")}]
+        timers = self._ctx.get("timers")
+        if not timers:
+            return
+        try:
+            timers.test({"type": "remote", "label": "remote %s" % proto, "actions": actions})
+        except Exception as e:
+            print("[listen] action error:", e)
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "receiving": self._capture is not None,
+            "protocols": self._protocols,
+            "bindings": len(self._bindings),
+            "pending": self._head - self._tail,
+            "dropped": self.dropped,
+            "last": self.last,
+        }
@@ -0,0 +1,157 @@
+import time
+
+# Recurrence rules for timers. Specs (JSON):
+#   {"every_minutes": 30}                          interval, anchored at the first run
+#   {"daily": "07:00"}
+#   {"weekly": {"days": ["mon", "fri"], "time": "07:00"}}   days: names, 0=Mon..6=Sun or a bit mask
+#   {"cron": "0 7 * * 1-5"}                        minute hour day month weekday (0/7=Sun)
+# Cron supports "*", numbers, lists "1,3", ranges "1-5" and steps "*/15", "0-30/10".
+
+_DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_SEARCH_DAYS = 366 * 4  # e.g. "29 2 * *" needs up to a leap year
+
+
+def _parse_field(text, lo, hi):
+    values = set()
+    for part in str(text).split(","):
+        step = 1
+        if "/" in part:
+            part, step_s = part.split("/", 1)
+            step = int(step_s)
+            if step < 1:
+                raise ValueError("Invalid step '%s'" % step_s)
+        if part == "*":
+            a, b = lo, hi
+        elif "-" in part:
+            a_s, b_s = part.split("-", 1)
+            a, b = int(a_s), int(b_s)
+        else:
+            a = int(part)
+            b = hi if step > 1 else a
+        if a < lo or b > hi or a > b:
+            raise ValueError("Value out of range %d-%d: '%s'" % (lo, hi, part))
+        values.update(range(a, b + 1, step))
+    return values
+
+
+def _parse_hhmm(text):
+    try:
+        hh, mm = str(text).split(":", 1)
+        h, m = int(hh), int(mm)
+    except Exception:
+        raise ValueError("Expected time as 'HH:MM', got '%s'" % text)
+    if not (0 <= h <= 23 and 0 <= m <= 59):
+        raise ValueError("Invalid time '%s'" % text)
+    return h, m
+
+
+def _parse_days(days):
+    """Weekdays (0=Mon..6=Sun) from a name/number list or a bit mask (bit0=Mon)."""
+    if isinstance(days, int):
+        out = set(d for d in range(7) if days & (1 << d))
+    else:
+        out = set()
+        for d in days or []:
+            if isinstance(d, str) and d[:3].lower() in _DAY_NAMES:
+                out.add(_DAY_NAMES.index(d[:3].lower()))
+            elif isinstance(d, int) and 0 <= d <= 6:
+                out.add(d)
+            else:
+                raise ValueError("Invalid weekday '%s'" % d)
+    if not out:
+        raise ValueError("No weekdays selected")
+    return out
+
+
+class IntervalRule:
+    def __init__(self, minutes):
+        self.period = int(minutes) * 60
+        if self.period <= 0:
+            raise ValueError("'every_minutes' must be positive")
+
+    def next_after(self, ts: int, anchor: int = None) -> int:
+        """First occurrence strictly after ts, on the grid anchor + k*period."""
+        if anchor is None or anchor > ts:
+            return ts + self.period if anchor is None else anchor
+        k = (ts - anchor) // self.period + 1
+        return anchor + k * self.period
+
+
+class CalendarRule:
+    """Minute/hour/day/month/weekday sets, matched in local time.
+
+    Local time is the device clock (UTC on the Pico) plus offset_s. Unlike
+    full cron, restricted day-of-month and weekday must both match.
+    """
+
+    def __init__(self, minutes, hours, mdays=None, months=None, wdays=None, offset_s: int = 0):
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.mdays = mdays  # None = any
+        self.months = months
+        self.wdays = wdays  # 0=Mon..6=Sun
+        self.offset = offset_s  # Local time = device clock + offset
+
+    def _day_ok(self, tm):
+        if self.months is not None and tm[1] not in self.months:
+            return False
+        if self.mdays is not None and tm[2] not in self.mdays:
+            return False
+        if self.wdays is not None and tm[6] not in self.wdays:
+            return False
+        return True
+
+    def next_after(self, ts: int, anchor: int = None) -> int:
+        """First matching minute strictly after ts (whole minutes)."""
+        local = ts + self.offset
+        tm = time.gmtime(local)
+        # Midnight of the current local day
+        day0 = local - (tm[3] * 3600 + tm[4] * 60 + tm[5])
+        for d in range(_SEARCH_DAYS):
+            start = day0 + d * 86400
+            if not self._day_ok(time.gmtime(start)):
+                continue
+            for h in self.hours:
+                for m in self.minutes:
+                    cand = start + h * 3600 + m * 60
+                    if cand > local:
+                        return cand - self.offset
+        raise ValueError("Rule never matches")
+
+
+def parse_rule(spec, utc_offset_minutes: int = 0):
+    """Build a rule from a JSON spec; raises ValueError when invalid."""
+    if not isinstance(spec, dict):
+        raise ValueError("'repeat' must be an object")
+    offset = int(utc_offset_minutes or 0) * 60
+    if "every_minutes" in spec:
+        try:
+            return IntervalRule(spec.get("every_minutes"))
+        except (TypeError, ValueError):
+            raise ValueError("'every_minutes' must be a positive integer")
+    if "daily" in spec:
+        h, m = _parse_hhmm(spec.get("daily"))
+        return CalendarRule([m], [h], offset_s=offset)
+    if "weekly" in spec:
+        w = spec.get("weekly") or {}
+        if not isinstance(w, dict):
+            raise ValueError("'weekly' must be an object with 'days' and 'time'")
+        h, m = _parse_hhmm(w.get("time"))
+        return CalendarRule([m], [h], wdays=_parse_days(w.get("days")), offset_s=offset)
+    if "cron" in spec:
+        fields = str(spec.get("cron")).split()
+        if len(fields) != 5:
+            raise ValueError("'cron' needs 5 fields: minute hour day month weekday")
+        try:
+            minutes = _parse_field(fields[0], 0, 59)
+            hours = _parse_field(fields[1], 0, 23)
+            mdays = None if fields[2] == "*" else _parse_field(fields[2], 1, 31)
+            months = None if fields[3] == "*" else _parse_field(fields[3], 1, 12)
+            wdays = None
+            if fields[4] != "*":
+                # cron: 0/7 = Sunday; gmtime: 0 = Monday
+                wdays = set((d + 6) % 7 for d in _parse_field(fields[4], 0, 7))
+        except ValueError as e:
+            raise ValueError("Invalid cron '%s': %s" % (spec.get("cron"), e))
+        return CalendarRule(minutes, hours, mdays, months, wdays, offset_s=offset)
+    raise ValueError("Unknown repeat rule; use every_minutes, daily, weekly or cron")
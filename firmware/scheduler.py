@@ -0,0 +1,86 @@
+import time
+
+try:
+    _ticks_ms = time.ticks_ms
+    _ticks_diff = time.ticks_diff
+except AttributeError:  # CPython fallback for local testing
+    def _ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def _ticks_diff(a, b):
+        return a - b
+
+
+# Monotonic milliseconds since boot, independent of wall-clock (RTC/NTP)
+# changes. Extends ticks_ms beyond its wrap; must be called at least once per
+# half ticks period (~6 days), which the server loop guarantees.
+_last_ticks = _ticks_ms()
+_mono = 0
+
+
+def mono_ms() -> int:
+    global _last_ticks, _mono
+    t = _ticks_ms()
+    _mono += _ticks_diff(t, _last_ticks)
+    _last_ticks = t
+    return _mono
+
+
+class SkewStat:
+    """Running count/last/max/average of a millisecond delay."""
+
+    def __init__(self):
+        self.count = 0
+        self.last = 0
+        self.max = 0
+        self._total = 0
+
+    def add(self, ms: int):
+        ms = int(ms)
+        self.count += 1
+        self.last = ms
+        self._total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "last_ms": self.last,
+            "max_ms": self.max,
+            "avg_ms": (self._total // self.count) if self.count else 0,
+        }
+
+
+class SchedStats:
+    """Scheduling precision metrics.
+
+    - loop_lag: how much later than planned the server loop's deadline
+      wait returned (timeouts only; handler time and early wakes for a
+      request are not counted)
+    - fire_skew: timer execution time minus its due time
+    - step_skew: executor step start minus its planned time (macro/timer steps)
+    - queue_delay: per priority class, transmit start minus the step's
+      planned start (time spent waiting for a busy transport)
+    """
+
+    def __init__(self):
+        self.loop_lag = SkewStat()
+        self.fire_skew = SkewStat()
+        self.step_skew = SkewStat()
+        self.queue_delay = {}  # priority class -> SkewStat
+
+    def queue(self, priority: str) -> SkewStat:
+        stat = self.queue_delay.get(priority)
+        if stat is None:
+            stat = self.queue_delay[priority] = SkewStat()
+        return stat
+
+    def to_dict(self):
+        return {
+            "loop_lag": self.loop_lag.to_dict(),
+            "fire_skew": self.fire_skew.to_dict(),
+            "step_skew": self.step_skew.to_dict(),
+            "queue_delay": dict((k, s.to_dict()) for k, s in self.queue_delay.items()),
+        }
+
@@ -8,9 +8,25 @@ try:
 except ImportError:
     import os  # CPython fallback for local testing
 
+from scheduler import mono_ms
+
+# Flash write counters (all writes, deferred or not)
+_stats = {"writes": 0, "bytes": 0}
+# Installed WriteBehind, if any (see enable_write_behind)
+_write_behind = None
+
 
 def read_json(path, default=None):
-    """Read JSON file from flash. Return default on missing/invalid content."""
+    """Read JSON file from flash. Return default on missing/invalid content.
+
+    Data still waiting in the write-behind buffer is returned instead of the
+    older file content, as a copy (like a fresh read, changing it does not
+    change what gets written).
+    """
+    if _write_behind is not None:
+        pending = _write_behind.pending(path)
+        if pending is not None:
+            return json.loads(json.dumps(pending[0]))
     try:
         with open(path, "r") as f:
             return json.load(f)
@@ -21,8 +37,21 @@ def read_json(path, default=None):
 def write_json_atomic(path, data):
     """Write JSON atomically to reduce corruption risk on power loss."""
     tmp = path + ".tmp"
+    text = json.dumps(data)
     with open(tmp, "w") as f:
-        json.dump(data, f)
+        f.write(text)
+    note_write(len(text))
+    replace_file(tmp, path)
+
+
+def note_write(nbytes):
+    """Count a flash write of nbytes (shown in /metrics)."""
+    _stats["writes"] += 1
+    _stats["bytes"] += nbytes
+
+
+def replace_file(tmp, path):
+    """Move a fully written tmp file over path."""
     try:
         # os.replace exists on CPython; on MicroPython use rename after remove
         if hasattr(os, "replace"):
@@ -38,3 +67,132 @@ def write_json_atomic(path, data):
             os.remove(tmp)
         except OSError:
             pass
+
+
+def append_line(path, text):
+    """Append one line to a text file (journals); counted like other writes."""
+    with open(path, "a") as f:
+        f.write(text)
+        f.write("\n")
+    note_write(len(text) + 1)
+
+
+def file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def write_json(path, data):
+    """Write JSON, deferred through the write-behind buffer when enabled.
+
+    Use for frequent edits (devices, timers, UI config); data handed over
+    must not be modified afterwards except through another write_json().
+    """
+    if _write_behind is None:
+        write_json_atomic(path, data)
+    else:
+        _write_behind.put(path, data)
+
+
+def flush_writes(path=None):
+    """Write pending data now (one file or all). Call before critical operations."""
+    if _write_behind is not None:
+        _write_behind.flush(path)
+
+
+def storage_stats():
+    out = {"writes": _stats["writes"], "bytes": _stats["bytes"]}
+    if _write_behind is not None:
+        out.update(_write_behind.stats())
+    return out
+
+
+class WriteBehind:
+    """Coalesces bursts of whole-file JSON writes.
+
+    - put() only records the latest data per file (dirty flag) and returns
+    - A file is written once no put() arrived for debounce_ms, or at the
+      latest max_delay_ms after its first unwritten put()
+    - tick()/next_due_ms() run from the server loop like the other services
+    - flush() writes immediately (shutdown, config save)
+    """
+
+    def __init__(self, debounce_ms: int = 1500, max_delay_ms: int = 10000):
+        self.debounce_ms = int(debounce_ms)
+        self.max_delay_ms = int(max_delay_ms)
+        # path -> [data, first put (mono ms), last put (mono ms)]
+        self._dirty = {}
+        self.coalesced = 0  # put() calls absorbed by a later write
+        self.failures = 0
+
+    def pending(self, path):
+        """(data,) while path has unwritten data, else None."""
+        entry = self._dirty.get(path)
+        return (entry[0],) if entry is not None else None
+
+    def put(self, path, data):
+        now = mono_ms()
+        entry = self._dirty.get(path)
+        if entry is None:
+            self._dirty[path] = [data, now, now]
+        else:
+            self.coalesced += 1
+            entry[0] = data
+            entry[2] = now
+
+    def _due(self, entry):
+        return min(entry[2] + self.debounce_ms, entry[1] + self.max_delay_ms)
+
+    def next_due_ms(self):
+        if not self._dirty:
+            return None
+        now = mono_ms()
+        return max(0, min(self._due(e) for e in self._dirty.values()) - now)
+
+    def tick(self):
+        if not self._dirty:
+            return
+        now = mono_ms()
+        for path in [p for p, e in self._dirty.items() if self._due(e) <= now]:
+            self._write(path)
+
+    def flush(self, path=None):
+        for p in ([path] if path is not None else list(self._dirty)):
+            if p in self._dirty:
+                self._write(p)
+
+    def _write(self, path):
+        data = self._dirty.pop(path)[0]
+        try:
+            write_json_atomic(path, data)
+        except Exception as e:
+            # Keep the data but retry no sooner than after another debounce
+            self.failures += 1
+            now = mono_ms()
+            self._dirty[path] = [data, now, now]
+            print("[storage] write failed:", path, e)
+
+    def stats(self):
+        return {
+            "dirty": list(self._dirty),
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "debounce_ms": self.debounce_ms,
+            "max_delay_ms": self.max_delay_ms,
+        }
+
+
+def enable_write_behind(debounce_ms: int = 1500, max_delay_ms: int = 10000):
+    """Route write_json() through a WriteBehind buffer; returns it."""
+    global _write_behind
+    _write_behind = WriteBehind(debounce_ms, max_delay_ms)
+    return _write_behind
@@ -1,11 +1,16 @@
 import time
+import heapq
 try:
     import urandom  # type: ignore
 except Exception:
     urandom = None  # type: ignore
 
-from storage import read_json, write_json_atomic
-from protocols.dispatch import send_command as dispatch_send
+from journal import JournalStore
+from executor import compile_actions
+from scheduler import mono_ms
+from recurrence import parse_rule, IntervalRule
+
+_RETRY_MS = 1000  # Next attempt for a due timer the executor had no room for
 
 
 def _now_s():
@@ -54,9 +59,19 @@ def _gen_id() -> str:
 class TimerManager:
     """MicroPython-friendly timer manager.
 
-    - Stores active timers on flash (JSON)
+    - Stores active timers on flash as a JournalStore (timers.json snapshot
+      plus timers.json.log); adding or removing a timer appends one record
+    - Keeps a min-heap of (due_ms, seq, id) so tick() only looks at due
+      entries; deleted timers leave stale heap entries that are skipped
+    - due_ms is monotonic (scheduler.mono_ms), kept apart from the wall-clock
+      trigger_ts that is persisted; the server loop waits until
+      next_deadline() and skew statistics go to ctx["sched_stats"]
     - Uses periodic tick() calls to evaluate and fire timers
-    - Executes actions via protocols.dispatch.send_command
+    - Compiles actions into a step plan run by the cooperative Executor
+      (ctx["executor"]), which sends via protocols.dispatch.send_command
+    - Recurring timers ("repeat" rule, see recurrence.py) stay active after
+      firing; the next occurrence is computed from the rule and only kept in
+      memory, so nothing is written when they fire
 
     Timer schema (dict):
       {
@@ -66,43 +81,137 @@ class TimerManager:
         "created_at": ISO8601 str,
         "trigger_time": ISO8601 str,
         "trigger_ts": int epoch seconds,
+        "delay_ms": int? (sub-second part of the requested delay),
+        "repeat": dict? (recurrence rule),
+        "anchor_ts": int? (first run of an interval rule; later runs keep its grid),
         "actions": [ { "device": str, "action": str, "repetitions": int?, "delay_ms": int? }, ... ]
       }
     """
 
-    def __init__(self, ctx: dict, filename: str = "timers.json"):
+    def __init__(self, ctx: dict, filename: str = "timers.json", utc_offset_minutes: int = 0, compact_bytes: int = 8192):
         self._ctx = ctx
         self._filename = filename
-        # id -> timer
-        data = read_json(self._filename, []) or []
-        self._active = {}
-        try:
-            for t in data:
-                if isinstance(t, dict) and t.get("id"):
-                    self._active[t["id"]] = t
-        except Exception:
-            self._active = {}
-        # Ephemeral test timers (not persisted)
-        self._ephemeral = []  # list of timers
+        self._utc_offset = utc_offset_minutes
+        self._stats = ctx.get("sched_stats")
+        # id -> timer (live dict of the store; mutate through _store)
+        self._store = JournalStore(filename, compact_bytes, key_field="id")
+        self._active = self._store.data()
+        # id -> compiled recurrence rule
+        self._rules = {}
+        now = _now_s()
+        for tid, t in list(self._active.items()):
+            if t.get("repeat") is None:
+                continue
+            try:
+                rule = parse_rule(t.get("repeat"), self._utc_offset)
+            except ValueError as e:
+                print("[timers] dropping bad rule:", tid, e)
+                self._journal(self._store.delete, tid)
+                continue
+            self._rules[tid] = rule
+            # Occurrences missed while powered off are skipped
+            if int(t.get("trigger_ts", 0)) <= now:
+                self._set_trigger(t, rule.next_after(now, t.get("anchor_ts")))
+        # Ephemeral test timers (not persisted): seq -> timer
+        self._ephemeral = {}
+        # Deadline heap of (due_ms, seq, id or None for ephemeral).
+        # _seq maps id -> seq of its live heap entry.
+        self._heap = []
+        self._seq = {}
+        self._next_seq = 0
+        for tid, t in self._active.items():
+            self._push(tid, t)
+        heapq.heapify(self._heap)
+
+    # ---- deadline heap ----
+    def _push(self, tid, t, due_ms=None):
+        if due_ms is None:
+            # Map the persisted wall-clock trigger onto the monotonic base
+            try:
+                remaining = int(t.get("trigger_ts", 0)) - _now_s()
+            except Exception:
+                remaining = 0
+            due_ms = mono_ms() + max(0, remaining) * 1000
+        seq = self._next_seq
+        self._next_seq += 1
+        if tid is None:
+            self._ephemeral[seq] = t
+        else:
+            self._seq[tid] = seq
+        heapq.heappush(self._heap, (due_ms, seq, tid))
+
+    def _live(self, entry):
+        _, seq, tid = entry
+        if tid is None:
+            return seq in self._ephemeral
+        return self._seq.get(tid) == seq
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and not self._live(heap[0]):
+            heapq.heappop(heap)
+        # Rebuild when deleted entries dominate the heap
+        if len(heap) > 8 and len(heap) > 2 * (len(self._seq) + len(self._ephemeral)):
+            self._heap = [e for e in heap if self._live(e)]
+            heapq.heapify(self._heap)
+
+    def next_deadline(self):
+        """Monotonic due time (ms) of the next timer, or None."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def next_due_ms(self):
+        """Milliseconds until the next timer is due (0 if overdue), or None."""
+        due = self.next_deadline()
+        if due is None:
+            return None
+        return max(0, due - mono_ms())
+
+    # ---- recurrence ----
+    def _set_trigger(self, t, ts):
+        t["trigger_ts"] = int(ts)
+        t["trigger_time"] = _iso_from_ts(ts)
+
+    def _reschedule(self, tid, t, rule, now_ms):
+        """Advance a recurring timer to its next occurrence (in memory only)."""
+        now = _now_s()
+        # Never before the occurrence that just fired, even if mono ran ahead
+        base = max(now, int(t.get("trigger_ts", 0)))
+        nxt = rule.next_after(base, t.get("anchor_ts"))
+        self._set_trigger(t, nxt)
+        self._push(tid, t, now_ms + (nxt - now) * 1000)
 
     # ---- persistence ----
-    def _persist(self):
+    def _journal(self, op, *args):
         try:
-            write_json_atomic(self._filename, list(self._active.values()))
+            op(*args)
         except Exception as e:
             print("[timers] persist failed:", e)
 
+    def journal_stats(self):
+        return self._store.stats()
+
     # ---- public API ----
     def list(self):
         return list(self._active.values())
 
     def add(self, payload: dict):
+        """Create a timer; raises ValueError for an invalid "repeat" rule."""
         now = _now_s()
-        try:
-            delay_min = int(payload.get("delay_minutes"))
-        except Exception:
-            delay_min = 0
-        trig = now + max(0, delay_min) * 60
+        start = mono_ms()
+        total_ms = 0
+        for key, scale in (("delay_minutes", 60000), ("delay_seconds", 1000), ("delay_ms", 1)):
+            try:
+                total_ms += int(float(payload.get(key)) * scale)
+            except Exception:
+                pass
+        total_ms = max(0, total_ms)
+        repeat = payload.get("repeat")
+        rule = parse_rule(repeat, self._utc_offset) if repeat is not None else None
+        if rule is not None and (total_ms == 0 or not isinstance(rule, IntervalRule)):
+            # Calendar rules ignore the delay; intervals default to one period
+            total_ms = (rule.next_after(now) - now) * 1000
+        trig = now + total_ms // 1000
         t = {
             "id": _gen_id(),
             "type": payload.get("type"),
@@ -112,23 +221,31 @@ class TimerManager:
             "trigger_ts": int(trig),
             "actions": payload.get("actions") or [],
         }
-        self._active[t["id"]] = t
-        self._persist()
+        if total_ms % 1000:
+            t["delay_ms"] = total_ms % 1000
+        if rule is not None:
+            t["repeat"] = repeat
+            if isinstance(rule, IntervalRule):
+                t["anchor_ts"] = int(trig)
+            self._rules[t["id"]] = rule
+        self._journal(self._store.put, t["id"], t)
+        self._push(t["id"], t, start + total_ms)
         return t
 
     def delete(self, timer_id: str) -> bool:
         if timer_id in self._active:
-            try:
-                del self._active[timer_id]
-            finally:
-                self._persist()
+            self._journal(self._store.delete, timer_id)
+            self._rules.pop(timer_id, None)
+            self._seq.pop(timer_id, None)  # Heap entry goes stale
             return True
         return False
 
     def test(self, payload: dict):
         """Execute a timer immediately, ignoring any delays in payload.
 
-        Does not persist the timer.
+        Does not persist the timer. Runs in the interactive priority class
+        (test button, physical remote bindings). Returns None when the
+        executor had no room for it.
         """
         now = _now_s()
         t = {
@@ -141,94 +258,78 @@ class TimerManager:
             "actions": payload.get("actions") or [],
         }
         # Fire immediately
-        self._fire(t)
+        if self._fire(t, "interactive") is None:
+            return None
         return t
 
     # ---- engine ----
     def tick(self):
-        """Evaluate timers and fire due ones.
+        """Pop and fire due timers from the deadline heap.
 
-        Should be called periodically (e.g., from server loop every ~200ms).
+        Called from the server loop, which wakes up at next_due_ms().
+        Cost is O(log n) per due timer; nothing is scanned when none is due.
         """
-        now = _now_s()
-
-        # Collect due persistent timers
-        due_ids = []
-        for tid, t in self._active.items():
-            try:
-                if int(t.get("trigger_ts", 0)) <= now:
-                    due_ids.append(tid)
-            except Exception:
-                pass
-
+        now = mono_ms()
+        heap = self._heap
         timers_to_fire = []
-        for tid in due_ids:
-            t = self._active.get(tid)
-            if t:
-                timers_to_fire.append(t)
-                try:
-                    del self._active[tid]
-                except Exception:
-                    pass
-
-        # Ephemeral timers
-        if self._ephemeral:
-            remaining = []
-            for t in self._ephemeral:
-                try:
-                    if int(t.get("trigger_ts", 0)) <= now:
-                        timers_to_fire.append(t)
-                    else:
-                        remaining.append(t)
-                except Exception:
-                    # drop invalid
-                    pass
-            self._ephemeral = remaining
-
-        # Persist after removals
-        if due_ids:
-            self._persist()
-
-        # Fire timers
-        for t in timers_to_fire:
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if not self._live(entry):
+                continue
+            due, seq, tid = entry
+            if self._stats is not None:
+                self._stats.fire_skew.add(now - due)
+            if tid is None:
+                timers_to_fire.append((None, self._ephemeral.pop(seq)))
+            else:
+                timers_to_fire.append((tid, self._active[tid]))
+
+        # Fire timers; they only move on (or go away) once the executor
+        # has taken their plan
+        for tid, t in timers_to_fire:
             try:
-                self._fire(t)
+                queued = self._fire(t) is not None
             except Exception as e:
                 print("[timers] fire error:", e)
+                queued = True  # Would fail again, do not retry
+            if not queued:
+                # Executor full: keep the timer (and its journal record)
+                self._push(tid, t, mono_ms() + _RETRY_MS)
+            elif tid is None:
+                pass
+            elif tid in self._rules:
+                try:
+                    self._reschedule(tid, t, self._rules[tid], now)
+                except ValueError as e:  # Rule has no further occurrence
+                    print("[timers] rule ended:", t.get("label"), e)
+                    self._journal(self._store.delete, tid)
+                    del self._rules[tid]
+                    del self._seq[tid]
+            else:
+                self._journal(self._store.delete, tid)
+                del self._seq[tid]
 
-    def _fire(self, timer: dict):
+        # Journal compaction, once it has grown past its threshold
+        self._store.tick()
+
+    def _fire(self, timer: dict, priority: str = "timer"):
+        """Hand the timer's actions to the cooperative executor.
+
+        Steps (and their delays) then run from the server loop without
+        blocking request handling. Returns the plan id (0 when there is
+        nothing to run), or None when the executor is full.
+        """
         actions = timer.get("actions") or []
         label = timer.get("label") or "(unnamed)"
         print("[timers] TRIGGER:", label, "-", len(actions), "actions")
 
-        for i, act in enumerate(actions):
-            dev = (act or {}).get("device")
-            cmd = (act or {}).get("action")
-            reps = None
-            try:
-                reps = int((act or {}).get("repetitions"))
-            except Exception:
-                reps = None
-            delay_ms = 1000
-            try:
-                if (act or {}).get("delay_ms") is not None:
-                    delay_ms = max(0, int(act.get("delay_ms")))
-            except Exception:
-                delay_ms = 1000
-
-            if dev and cmd:
-                print("  ->", dev, cmd, "reps=", reps or "default")
-                options = {"repetitions": reps} if reps else None
-                try:
-                    status, payload = dispatch_send(self._ctx, dev, cmd, options)
-                    if status != 200:
-                        print("    send failed:", status, payload)
-                except Exception as e:
-                    print("    send exception:", e)
-
-            # Wait between actions except after last
-            if i < len(actions) - 1:
-                try:
-                    time.sleep_ms(int(delay_ms))
-                except Exception:
-                    time.sleep(1)
+        executor = self._ctx.get("executor")
+        if executor is None:
+            raise RuntimeError("Executor not available")
+        steps = compile_actions(actions)
+        if not steps:
+            return 0
+        plan_id = executor.submit(steps, label, priority=priority)
+        if plan_id is None:
+            print("[timers] executor busy:", label)
+        return plan_id
@@ -0,0 +1,58 @@
+from scheduler import mono_ms
+
+
+class TransportScheduler:
+    """Knows which physical resources are in use and until when.
+
+    - Every transmitted TxJob marks its resources (IR emitter, GPIO pins, ...)
+      busy for its air time; blocking transports are done when transmit()
+      returns, unless the job went to the core-1 worker
+    - wait_ms(job) tells how long until all resources of a job are free, so
+      the executor can run jobs on other resources meanwhile instead of
+      spinning
+    - order() puts non-blocking jobs (carried on by hardware, e.g. the IR
+      PIO) before blocking ones (busy-waited GPIO protocols) so a parallel
+      group takes about as long as its slowest transport
+    """
+
+    def __init__(self):
+        self._free_at = {}  # resource -> mono ms when it is free again
+        self.parallel = 0  # Jobs started while another resource was still busy
+
+    def wait_ms(self, job):
+        now = mono_ms()
+        wait = 0
+        for r in job.resources:
+            wait = max(wait, self._free_at.get(r, 0) - now)
+        return wait
+
+    def free_in_ms(self, resource: str) -> int:
+        """ms until resource is free (<= 0 when it is)."""
+        return self._free_at.get(resource, 0) - mono_ms()
+
+    def note(self, job, started_ms: int, offloaded: bool = False):
+        """Record a transmission of job that started at started_ms
+        (offloaded: handed to the core-1 worker, not sent yet)."""
+        now = mono_ms()
+        if any(t > started_ms for r, t in self._free_at.items() if r not in job.resources):
+            self.parallel += 1
+        # Non-blocking jobs keep their resources until the frame is on air
+        # (after any frame still queued before it on the same resource)
+        if job.blocking and not offloaded:
+            end = now
+        else:
+            start = max([started_ms] + [self._free_at.get(r, 0) for r in job.resources])
+            end = start + job.air_time_ms
+        for r in job.resources:
+            self._free_at[r] = end
+
+    @staticmethod
+    def order(jobs):
+        return [j for j in jobs if not j.blocking] + [j for j in jobs if j.blocking]
+
+    def status(self):
+        now = mono_ms()
+        return {
+            "busy": dict((r, t - now) for r, t in self._free_at.items() if t > now),
+            "parallel": self.parallel,
+        }
@@ -0,0 +1,228 @@
+import os
+import socket
+import struct
+
+try:
+    import uhashlib as hashlib  # MicroPython
+except ImportError:
+    import hashlib  # type: ignore
+
+from protocols.dispatch import compile_command, transmit
+from scheduler import mono_ms
+
+VERSION = 2
+# Datagram: version, op, seq, session, table, device id, command id,
+# repetitions (0 = device default), followed by an 8-byte auth tag
+_REQ = "<BBHIHHHB"
+_REQ_SIZE = struct.calcsize(_REQ)
+_TAG_SIZE = 8
+# Ack: version, status, seq, eta_ms
+_ACK = "<BBHH"
+
+OP_SEND, OP_HOLD, OP_RELEASE = 1, 2, 3
+ST_OK, ST_STALE, ST_UNKNOWN, ST_BUSY, ST_ERROR = 0, 1, 2, 3, 4
+
+_MAX_SESSIONS = 8
+
+
+def _device_commands(dev):
+    """Command names of a device entry (learned or configured maps)."""
+    protocol = (dev.get("protocol") or "IR").upper()
+    if protocol == "IR":
+        return list(((dev.get("ir") or {}).get("commands") or {}).keys())
+    if protocol == "KENWOOD_XS8":
+        from protocols.kenwood_xs8 import DEFAULT_COMMANDS
+
+        return list(((dev.get("kenwood_xs8") or {}).get("commands") or DEFAULT_COMMANDS).keys())
+    return list(((dev.get(protocol.lower()) or {}).get("commands") or {}).keys())
+
+
+class UdpRemote:
+    """Binary UDP path for remote buttons (HTTP stays for configuration).
+
+    - The app fetches the id table once (GET /udp/table): devices and their
+      commands, sorted by name, numbered from 0; the table number (low 16
+      bits of the devices store version) goes into every datagram and a
+      stale one is answered with ST_STALE so the app refetches
+    - Every table fetch opens a session: a random 32-bit id the app puts
+      into its datagrams; the last _MAX_SESSIONS sessions are kept (least
+      recently used dropped) and an unknown one is answered with ST_STALE
+    - Datagrams carry an HMAC-SHA256 tag (first 8 bytes) keyed with the API
+      key over the header (session included); bad tags are dropped without
+      reply
+    - A sequence number per session, whatever address it comes from: a
+      repeated seq gets the stored ack again without transmitting, older
+      ones are ignored, so a captured datagram cannot be replayed; after a
+      reboot or eviction its session is unknown
+    - Replies are a 6-byte ack with a status and the send's eta_ms
+    - The socket is polled together with the HTTP listener by the server
+      loop (sock), tick() drains it without blocking
+    """
+
+    def __init__(self, ctx: dict, port: int = 4210, api_key: str = None):
+        self._ctx = ctx
+        self.port = int(port)
+        self._pads = None
+        if api_key:
+            key = api_key.encode()
+            if len(key) > 64:
+                key = hashlib.sha256(key).digest()
+            key = key + bytes(64 - len(key))
+            self._pads = (bytes(b ^ 0x36 for b in key), bytes(b ^ 0x5C for b in key))
+        self._table = None  # (version, [(name, [commands])])
+        # session id -> [last seq or None, ack bytes, mono ms, seq advance]
+        self._sessions = {}
+        self.sock = None
+        self.received = 0
+        self.dropped = 0
+        self.duplicates = 0
+
+    def start(self):
+        addr = socket.getaddrinfo("0.0.0.0", self.port)[0][-1]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(addr)
+        self.sock.settimeout(0)
+        print("UDP remote listening on port", self.port)
+
+    def stop(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    # ---- id table ----
+    def _version(self):
+        return self._ctx["devices"].version & 0xFFFF
+
+    def table(self):
+        version = self._version()
+        if self._table is None or self._table[0] != version:
+            devices = self._ctx["devices"].data()
+            entries = []
+            for name in sorted(devices):
+                entries.append((name, sorted(_device_commands(devices[name]))))
+            self._table = (version, entries)
+        return self._table
+
+    def open_session(self) -> int:
+        while True:
+            sid = struct.unpack("<I", os.urandom(4))[0]
+            if sid and sid not in self._sessions:
+                break
+        if len(self._sessions) >= _MAX_SESSIONS:
+            oldest = min(self._sessions, key=lambda s: self._sessions[s][2])
+            del self._sessions[oldest]
+        self._sessions[sid] = [None, None, mono_ms(), 0]
+        return sid
+
+    def table_dict(self):
+        version, entries = self.table()
+        return {
+            "port": self.port,
+            "session": self.open_session(),
+            "table": version,
+            "devices": [{"id": i, "name": name, "commands": cmds} for i, (name, cmds) in enumerate(entries)],
+        }
+
+    # ---- datagrams ----
+    def _tag(self, msg):
+        inner = hashlib.sha256(self._pads[0] + msg).digest()
+        return hashlib.sha256(self._pads[1] + inner).digest()[:_TAG_SIZE]
+
+    def _authentic(self, data):
+        if self._pads is None:
+            return True
+        tag = self._tag(data[:_REQ_SIZE])
+        diff = 0
+        for a, b in zip(tag, data[_REQ_SIZE:_REQ_SIZE + _TAG_SIZE]):
+            diff |= a ^ b
+        return diff == 0
+
+    def next_due_ms(self):
+        return None  # Woken through sock by the server loop
+
+    def tick(self):
+        if self.sock is None:
+            return
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(64)
+            except OSError:
+                return  # Nothing pending
+            self.received += 1
+            if len(data) != _REQ_SIZE + _TAG_SIZE or data[0] != VERSION or not self._authentic(data):
+                self.dropped += 1
+                continue
+            ack = self._handle(addr, *struct.unpack_from(_REQ, data))
+            if ack is not None:
+                try:
+                    self.sock.sendto(ack, addr)
+                except OSError as e:
+                    print("[udp] ack failed:", e)
+
+    def _handle(self, addr, _version, op, seq, session, table, dev_id, cmd_id, reps):
+        state = self._sessions.get(session)
+        if state is None:
+            # Unknown (rebooted, evicted or replayed from an old session)
+            return struct.pack(_ACK, VERSION, ST_STALE, seq, 0)
+        if state[0] is not None:
+            ahead = (seq - state[0]) & 0xFFFF
+            if ahead == 0:
+                self.duplicates += 1
+                return state[1]
+            if ahead >= 0x8000:
+                self.duplicates += 1
+                return None  # Older than the last one: late retransmit or replay
+            state[3] += ahead
+            if state[3] >= 0x8000:
+                # Half the seq space used: old seqs would look new again
+                del self._sessions[session]
+                return struct.pack(_ACK, VERSION, ST_STALE, seq, 0)
+        status, eta = self._run(addr, op, table, dev_id, cmd_id, reps)
+        ack = struct.pack(_ACK, VERSION, status, seq, min(0xFFFF, max(0, eta)))
+        state[0] = seq
+        state[1] = ack
+        state[2] = mono_ms()
+        return ack
+
+    def _run(self, addr, op, table, dev_id, cmd_id, reps):
+        version, entries = self.table()
+        if table != version:
+            return ST_STALE, 0
+        if dev_id >= len(entries) or cmd_id >= len(entries[dev_id][1]):
+            return ST_UNKNOWN, 0
+        name = entries[dev_id][0]
+        command = entries[dev_id][1][cmd_id]
+        holds = self._ctx.get("holds")
+        if op == OP_RELEASE:
+            if holds is None:
+                return ST_ERROR, 0
+            return (ST_OK if holds.stop(name)[0] == 200 else ST_UNKNOWN), 0
+        admission = self._ctx.get("admission")
+        if admission is not None and not (op == OP_HOLD and holds is not None and holds.holding(name, command)):
+            if admission.admit(addr[0] if isinstance(addr, tuple) else addr):
+                return ST_BUSY, 0
+        if op == OP_HOLD:
+            if holds is None:
+                return ST_ERROR, 0
+            status, payload = holds.start(name, command)
+            return (ST_OK if status == 200 else ST_ERROR), 0
+        if op != OP_SEND:
+            return ST_ERROR, 0
+        status, job = compile_command(self._ctx, name, command, {"repetitions": reps} if reps else None)
+        if status != 200:
+            return ST_ERROR, 0
+        status, payload = transmit(self._ctx, job)
+        if status not in (200, 202):
+            print("[udp] send failed:", name, command, status, payload)
+            return ST_ERROR, 0
+        return ST_OK, payload.get("eta_ms", 0)
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "listening": self.sock is not None,
+            "received": self.received,
+            "dropped": self.dropped,
+            "duplicates": self.duplicates,
+            "sessions": len(self._sessions),
+        }
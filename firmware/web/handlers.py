@@ -2,7 +2,11 @@ import time
 
 import ujson as json  # type: ignore
 
-from storage import read_json, write_json_atomic
+from storage import read_json, write_json, storage_stats
+from jsonstream import materialize
+from recurrence import parse_rule
+from batch import compile_batch, BatchRun
+from protocols.job import IR_EMITTER
 from protocols.dispatch import send_command as dispatch_send, setup_command as dispatch_setup
 
 
@@ -25,10 +29,51 @@ def health_handler(ctx, req):
         "status": "ok",
         "wifi": {"status": status, "ip": ip},
         "uptime_ms": uptime_ms,
+        "boot": ctx.get("boot"),
         "free_mem": None,  # Could add gc.mem_free() if desired
     }
 
 
+def metrics_handler(ctx, req):
+    """Runtime metrics (scheduling precision, flash writes, ...)."""
+    out = {"uptime_ms": time.ticks_ms(), "storage": storage_stats()}
+    stats = ctx.get("sched_stats")
+    if stats is not None:
+        out["scheduler"] = stats.to_dict()
+    executor = ctx.get("executor")
+    if executor is not None:
+        out["plans"] = executor.running()
+        out["queues"] = executor.stats()
+    transports = ctx.get("transports")
+    if transports is not None:
+        out["transports"] = transports.status()
+    holds = ctx.get("holds")
+    if holds is not None:
+        out["holds"] = holds.stats()
+    coalescer = ctx.get("coalescer")
+    if coalescer is not None:
+        out["coalesce"] = coalescer.stats()
+    admission = ctx.get("admission")
+    if admission is not None:
+        out["admission"] = admission.stats()
+    udp = ctx.get("udp")
+    if udp is not None:
+        out["udp"] = udp.stats()
+    idem = ctx.get("idempotency")
+    if idem is not None:
+        out["idempotency"] = idem.stats()
+    worker = ctx.get("core1")
+    if worker is not None:
+        out["core1"] = worker.stats()
+    journals = {}
+    if ctx.get("devices") is not None:
+        journals["devices"] = ctx["devices"].stats()
+    if ctx.get("timers") is not None:
+        journals["timers"] = ctx["timers"].journal_stats()
+    out["journals"] = journals
+    return 200, out
+
+
 def info_handler(ctx, req):
     cfg = ctx.get("config", {})
     return 200, {
@@ -77,22 +122,18 @@ def ui_config_put_handler(ctx, req):
     """
     if req.json is None:
         return 400, {"error": "Expected JSON body with Content-Type: application/json"}
-    write_json_atomic(_ui_config_filename(ctx), req.json)
+    write_json(_ui_config_filename(ctx), req.json)
     return 200, req.json
 
 
 # ----- Devices CRUD -----
 
 def _load_devices(ctx):
-    return read_json(ctx.get("devices_filename"), {}) or {}
-
-
-def _save_devices(ctx, devices):
-    write_json_atomic(ctx.get("devices_filename"), devices)
+    return ctx["devices"].data()
 
 
 def devices_list_handler(ctx, req):
-    return 200, _load_devices(ctx)
+    return 200, materialize(_load_devices(ctx))
 
 
 def device_get_handler(ctx, req):
@@ -110,7 +151,7 @@ def device_get_handler(ctx, req):
         # Fallback in case of unexpected types
         for k in dev:
             resp[k] = dev[k]
-    return 200, resp
+    return 200, materialize(resp)
 
 
 def _deep_merge(a, b):
@@ -131,33 +172,37 @@ def device_put_handler(ctx, req):
     name = body.get("name")
     if not name:
         return 400, {"error": "Missing 'name' in body"}
-    devices = _load_devices(ctx)
-    current = devices.get(name, {})
-    devices[name] = _deep_merge(current, body)
-    _save_devices(ctx, devices)
+    store = ctx["devices"]
+    devices = store.data()
+    store.put(name, _deep_merge(devices.get(name, {}), body))
     dev_payload = {"name": name}
     try:
         dev_payload.update(devices[name])
     except Exception:
         for k in devices[name]:
             dev_payload[k] = devices[name][k]
-    return 200, {"status": "saved", "device": dev_payload}
+    return 200, {"status": "saved", "device": materialize(dev_payload)}
 
 
 def device_delete_handler(ctx, req):
     name = req.params.get("name")
     if not name:
         return 400, {"error": "Missing 'name'"}
-    devices = _load_devices(ctx)
-    if name not in devices:
+    if ctx["devices"].delete(name) is None:
         return 404, {"error": f"Unknown device '{name}'"}
-    del devices[name]
-    _save_devices(ctx, devices)
     return 200, {"status": "deleted", "name": name}
 
 
 # ----- Device operations by protocol -----
 
+def _admit(ctx, req, cost_ms: int = 0):
+    """Admission control for transmitting requests: None or (429/503, error)."""
+    admission = ctx.get("admission")
+    if admission is None:
+        return None
+    return admission.admit(req.client, cost_ms)
+
+
 def device_send_handler(ctx, req):
     name = req.params.get("name") or req.params.get("device") or (req.json or {}).get("name")
     command = req.params.get("command") or (req.json or {}).get("command")
@@ -173,6 +218,10 @@ def device_send_handler(ctx, req):
         except Exception:
             return 400, {"error": "Invalid 'repetitions' value"}
 
+    refused = _admit(ctx, req)
+    if refused:
+        return refused
+
     # Allow comma-separated multiple commands in 'command' parameter
     if "," in str(command):
         commands = [c.strip() for c in str(command).split(",") if c.strip()]
@@ -181,23 +230,240 @@ def device_send_handler(ctx, req):
         for cmd in commands:
             status, payload = dispatch_send(ctx, name, cmd, options)
             results.append({"command": cmd, "status": status, "payload": payload})
-            if status != 200:
+            if status not in (200, 202):
                 overall_ok = False
         # Always return 200 with per-command statuses to avoid partial failures blocking response
         return 200, {"status": "multi", "device": name, "results": results}
 
-    # Single command behavior (preserve original return semantics)
+    # Single command behavior (preserve original return semantics); rapid
+    # identical presses may be merged by the coalescer (202)
+    coalescer = ctx.get("coalescer")
+    if coalescer is not None:
+        return coalescer.send(name, command, options)
     return dispatch_send(ctx, name, command, options)
 
 
+def device_batch_handler(ctx, req):
+    """Run a list of commands across devices; results stream back as NDJSON.
+
+    Body: {"items": [{"device", "command", "repetitions"?, "delay_ms"?}, ...]}
+    (or the bare list). Everything is validated first: any bad item fails
+    the whole batch with per-item errors and nothing is sent.
+    """
+    body = req.json
+    items = body.get("items") if isinstance(body, dict) else body
+    steps, jobs, err = compile_batch(ctx, items)
+    if err:
+        return err
+    executor = ctx.get("executor")
+    streams = ctx.get("streams")
+    if executor is None or streams is None:
+        return 501, {"error": "Executor not available"}
+    if streams.full():
+        return 503, {"error": "Too many batches streaming"}
+    refused = _admit(ctx, req, sum(job.air_us for job in jobs if IR_EMITTER in job.resources) // 1000)
+    if refused:
+        return refused
+    run = BatchRun(jobs)
+    run.plan_id = executor.submit(steps, "batch", run.on_result, run.on_done, "interactive")
+    if run.plan_id is None:
+        return 503, {"error": "Too many sequences running"}
+    return 200, run
+
+
+def device_hold_start_handler(ctx, req):
+    """Start (or keep alive) a press-and-hold; repeat within hold.deadman_ms."""
+    holds = ctx.get("holds")
+    if holds is None:
+        return 501, {"error": "Hold not available"}
+    body = req.json if isinstance(req.json, dict) else {}
+    name = req.params.get("name") or req.params.get("device") or body.get("name") or body.get("device")
+    command = req.params.get("command") or body.get("command")
+    if not name or not command:
+        return 400, {"error": "Missing 'name' or 'command'"}
+    if not holds.holding(name, command):  # Keep-alives are always let through
+        refused = _admit(ctx, req)
+        if refused:
+            return refused
+    return holds.start(name, command)
+
+
+def device_hold_stop_handler(ctx, req):
+    holds = ctx.get("holds")
+    if holds is None:
+        return 501, {"error": "Hold not available"}
+    body = req.json if isinstance(req.json, dict) else {}
+    name = req.params.get("name") or req.params.get("device") or body.get("name") or body.get("device")
+    hold_id = req.params.get("id") or body.get("hold_id")
+    if not name and not hold_id:
+        return 400, {"error": "Missing 'name' or 'id'"}
+    try:
+        hold_id = int(hold_id) if hold_id is not None else None
+    except Exception:
+        return 400, {"error": "Invalid 'id'"}
+    return holds.stop(name, hold_id)
+
+
+def udp_table_handler(ctx, req):
+    """Id table of the UDP remote path (fetch once, refetch on ST_STALE)."""
+    udp = ctx.get("udp")
+    if udp is None:
+        return 501, {"error": "UDP remote not enabled"}
+    return 200, udp.table_dict()
+
+
 def device_setup_handler(ctx, req):
     name = req.params.get("name") or req.params.get("device") or (req.json or {}).get("name")
     command = req.params.get("command") or (req.json or {}).get("command")
     if not name or not command:
         return 400, {"error": "Missing 'name' or 'command'"}
+    learn = _get_learn_mgr(ctx)
+    if learn is not None and learn.busy():
+        # The running session owns the receiver
+        return 409, {"error": "Learning already in progress"}
     return dispatch_setup(ctx, name, command)
 
 
+# ----- IR learning sessions -----
+
+def _get_learn_mgr(ctx):
+    return ctx.get("learn")
+
+
+def device_learn_start_handler(ctx, req):
+    """Start a background learning session; poll GET /device/learn?id= for progress."""
+    mgr = _get_learn_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Learning not available"}
+    body = req.json if isinstance(req.json, dict) else {}
+    name = req.params.get("name") or req.params.get("device") or body.get("name")
+    command = req.params.get("command") or body.get("command")
+    if not name or not command:
+        return 400, {"error": "Missing 'name' or 'command'"}
+    timeout_ms = req.params.get("timeout_ms") or body.get("timeout_ms")
+    samples = req.params.get("samples") or body.get("samples")
+    return mgr.start(name, command, timeout_ms, samples)
+
+
+def device_learn_get_handler(ctx, req):
+    mgr = _get_learn_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Learning not available"}
+    sid = req.params.get("id")
+    if not sid:
+        return 400, {"error": "Missing 'id' query parameter"}
+    s = mgr.get(sid)
+    if not s:
+        return 404, {"error": "Unknown learning session"}
+    return 200, s
+
+
+def device_learn_cancel_handler(ctx, req):
+    mgr = _get_learn_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Learning not available"}
+    sid = req.params.get("id")
+    if not sid:
+        return 400, {"error": "Missing 'id' query parameter"}
+    if not mgr.cancel(sid):
+        return 404, {"error": "Unknown learning session"}
+    return 200, mgr.get(sid)
+
+
+# ----- IR listen mode (physical remotes trigger actions) -----
+
+def _get_listener(ctx):
+    return ctx.get("listener")
+
+
+def ir_listen_get_handler(ctx, req):
+    listener = _get_listener(ctx)
+    if not listener:
+        return 501, {"error": "IR listen mode not available"}
+    return 200, listener.status()
+
+
+def ir_bindings_get_handler(ctx, req):
+    listener = _get_listener(ctx)
+    if not listener:
+        return 501, {"error": "IR listen mode not available"}
+    return 200, listener.bindings()
+
+
+def ir_bindings_put_handler(ctx, req):
+    """Replace all bindings. Body: JSON list of binding objects."""
+    listener = _get_listener(ctx)
+    if not listener:
+        return 501, {"error": "IR listen mode not available"}
+    err = listener.set_bindings(req.json)
+    if err:
+        return 400, {"error": err}
+    return 200, listener.bindings()
+
+
+# ----- Macros (multi-device scenes) -----
+
+def _get_macro_mgr(ctx):
+    return ctx.get("macros")
+
+
+def macros_list_handler(ctx, req):
+    mgr = _get_macro_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Macros not available"}
+    return 200, mgr.list()
+
+
+def macro_get_handler(ctx, req):
+    mgr = _get_macro_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Macros not available"}
+    name = req.params.get("name")
+    if not name:
+        return 400, {"error": "Missing 'name'"}
+    macro = mgr.get(name)
+    if macro is None:
+        return 404, {"error": f"Unknown macro '{name}'"}
+    return 200, macro
+
+
+def macro_put_handler(ctx, req):
+    """Create or replace a macro. Body: {"name": str, "steps": [...]}."""
+    mgr = _get_macro_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Macros not available"}
+    if not req.json or not isinstance(req.json, dict):
+        return 400, {"error": "Expected JSON object"}
+    name = req.json.get("name")
+    if not name:
+        return 400, {"error": "Missing 'name' in body"}
+    return mgr.put(name, req.json)
+
+
+def macro_delete_handler(ctx, req):
+    mgr = _get_macro_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Macros not available"}
+    name = req.params.get("name")
+    if not name:
+        return 400, {"error": "Missing 'name'"}
+    if not mgr.delete(name):
+        return 404, {"error": f"Unknown macro '{name}'"}
+    return 200, {"status": "deleted", "name": name}
+
+
+def macro_run_handler(ctx, req):
+    """Run a stored macro in the background (202); ?name= or {"name": ...}."""
+    mgr = _get_macro_mgr(ctx)
+    if not mgr:
+        return 501, {"error": "Macros not available"}
+    body = req.json if isinstance(req.json, dict) else {}
+    name = req.params.get("name") or body.get("name")
+    if not name:
+        return 400, {"error": "Missing 'name'"}
+    return mgr.run(name, req.client)  # Admitted against the plan's air time
+
+
 def device_send_ws_handler(ctx, ws):
     """Handles device/send commands over WebSocket."""
     while ws.open:
@@ -248,11 +514,18 @@ def timers_get_handler(ctx, req):
 def _validate_timer_payload(body):
     if not isinstance(body, dict):
         return False, "Expected JSON object"
-    required = ["type", "label", "actions", "delay_minutes"]
+    required = ["type", "label", "actions"]
+    if body.get("repeat") is None:
+        required.append("delay_minutes")  # Recurring timers are scheduled by their rule
     if not all(k in body for k in required):
         return False, "Missing required fields: %s" % ", ".join(required)
     if not isinstance(body.get("actions"), list) or not body.get("actions"):
         return False, "'actions' must be a non-empty list"
+    if body.get("repeat") is not None:
+        try:
+            parse_rule(body.get("repeat"))
+        except ValueError as e:
+            return False, str(e)
     return True, None
 
 
@@ -279,9 +552,13 @@ def timers_test_handler(ctx, req):
     ok, err = _validate_timer_payload(body)
     if not ok:
         return 400, {"error": err}
+    refused = _admit(ctx, req)
+    if refused:
+        return refused
     try:
-        mgr.test(body)
-        return 200, {"message": "Timer test executed immediately"}
+        if mgr.test(body) is None:
+            return 503, {"error": "Executor busy", "retry_after_s": 1}
+        return 200, {"message": "Timer test started"}
     except Exception as e:
         return 500, {"error": str(e)}
 
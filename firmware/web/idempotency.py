@@ -0,0 +1,87 @@
+try:
+    from ucollections import OrderedDict  # type: ignore
+except ImportError:
+    from collections import OrderedDict
+
+try:
+    import uhashlib as hashlib  # MicroPython
+except ImportError:
+    import hashlib  # type: ignore
+
+import ujson as json  # type: ignore
+
+# Only requests that change something are replayed; GETs always run
+METHODS = ("POST", "PUT", "DELETE")
+_SKIP_PARAMS = ("rid", "apikey")
+
+
+class IdempotencyCache:
+    """Bounded LRU of recent request ids and their responses.
+
+    - Keyed by (client, method, path, id) from the Idempotency-Key header
+      or the rid parameter, so ids of different clients never collide;
+      only POST/PUT/DELETE requests take part
+    - A retry with a known id gets the stored (status, payload) back and
+      the handler does not run again (no transmission, no flash write)
+    - Each entry remembers a hash of the query and body; an id reused for
+      a different request answers 422 instead of the old response
+    - Payloads are stored as a copy, so later changes to live state (e.g.
+      a session dict) do not show up in a replay
+    - Busy answers (429/503) and server errors are not stored: the retry
+      should really run
+    - Streamed responses store a 409 naming the plan, since their results
+      went to the first connection
+    """
+
+    def __init__(self, size: int = 16):
+        self.size = max(1, int(size))
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.mismatches = 0
+
+    @staticmethod
+    def key(req):
+        if req.method not in METHODS:
+            return None
+        rid = req.headers.get("idempotency-key") or req.params.get("rid")
+        if not rid:
+            return None
+        return (req.client, req.method, req.path, rid)
+
+    @staticmethod
+    def fingerprint(req) -> bytes:
+        h = hashlib.sha256()
+        for k in sorted(req.params):
+            if k not in _SKIP_PARAMS:
+                h.update(("%s=%s&" % (k, req.params[k])).encode())
+        if req.body_raw:
+            h.update(bytes(req.body_raw))
+        return h.digest()[:8]
+
+    def get(self, key, fingerprint: bytes = None):
+        """Stored (status, payload) for key, a 422 when the id was used for
+        a different request, or None."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._entries[key] = entry  # Most recently used again
+        if fingerprint is not None and entry[0] != fingerprint:
+            self.mismatches += 1
+            return 422, {"error": "Idempotency key was used for a different request"}
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, status: int, payload, fingerprint: bytes = None):
+        if status >= 500 or status == 429:
+            return
+        if hasattr(payload, "poll"):
+            status, payload = 409, {"error": "Request with this id already ran", "plan_id": getattr(payload, "plan_id", None)}
+        else:
+            payload = json.loads(json.dumps(payload))  # Snapshot as sent
+        self._entries.pop(key, None)
+        self._entries[key] = (fingerprint, status, payload)
+        while len(self._entries) > self.size:
+            del self._entries[next(iter(self._entries))]
+
+    def stats(self):
+        return {"size": self.size, "entries": len(self._entries), "hits": self.hits, "mismatches": self.mismatches}
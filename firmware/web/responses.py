@@ -5,6 +5,7 @@ def _status_line(code: int) -> str:
     mapping = {
         200: "200 OK",
         201: "201 Created",
+        202: "202 Accepted",
         204: "204 No Content",
         400: "400 Bad Request",
         401: "401 Unauthorized",
@@ -12,7 +13,12 @@ def _status_line(code: int) -> str:
         404: "404 Not Found",
         405: "405 Method Not Allowed",
         408: "408 Request Timeout",
+        409: "409 Conflict",
+        422: "422 Unprocessable Entity",
+        429: "429 Too Many Requests",
         500: "500 Internal Server Error",
+        501: "501 Not Implemented",
+        503: "503 Service Unavailable",
     }
     return mapping.get(code, f"{code} OK")
 
@@ -20,8 +26,8 @@ def _status_line(code: int) -> str:
 def cors_headers():
     return (
         "Access-Control-Allow-Origin: *\r\n"
-        "Access-Control-Allow-Methods: GET, POST, PUT, OPTIONS\r\n"
-        "Access-Control-Allow-Headers: Content-Type, X-API-Key\r\n"
+        "Access-Control-Allow-Methods: GET, POST, PUT, DELETE, OPTIONS\r\n"
+        "Access-Control-Allow-Headers: Content-Type, X-API-Key, Idempotency-Key\r\n"
     )
 
 
@@ -31,10 +37,34 @@ def send_preflight(conn):
     conn.send("\r\n")
 
 
-def json_response(conn, code: int, payload):
+def json_response(conn, code: int, payload, headers=None):
     body = json.dumps(payload)
     conn.send("HTTP/1.1 %s\r\n" % _status_line(code))
     conn.send("Content-Type: application/json\r\n")
     conn.send(cors_headers())
+    for k, v in (headers or {}).items():
+        conn.send("%s: %s\r\n" % (k, v))
+    if code in (429, 503) and isinstance(payload, dict) and "retry_after_s" in payload:
+        conn.send("Retry-After: %d\r\n" % payload["retry_after_s"])
     conn.send("Content-Length: %d\r\n\r\n" % len(body))
     conn.send(body)
+
+
+def chunked_start(conn, code: int, content_type: str = "application/x-ndjson"):
+    """Send headers of a streamed response; follow with send_chunk()/chunked_end()."""
+    conn.send("HTTP/1.1 %s\r\n" % _status_line(code))
+    conn.send("Content-Type: %s\r\n" % content_type)
+    conn.send(cors_headers())
+    conn.send("Transfer-Encoding: chunked\r\n\r\n")
+
+
+def send_chunk(conn, payload):
+    """Send one JSON value as a newline-terminated chunk."""
+    line = (json.dumps(payload) + "\n").encode()
+    conn.send("%x\r\n" % len(line))
+    conn.send(line)
+    conn.send("\r\n")
+
+
+def chunked_end(conn):
+    conn.send("0\r\n\r\n")
@@ -1,32 +1,112 @@
 import socket
-import time
+import select
 import ujson as json  # type: ignore
 
+from scheduler import mono_ms
+from storage import flush_writes
 from .responses import json_response, send_preflight
 
 
-def _parse_request(raw: str):
-    # Very small HTTP parser sufficient for our use-case
-    lines = raw.split("\r\n")
-    if not lines or " " not in lines[0]:
-        return None, None, None, {}, ""
-    method, target, _ = lines[0].split(" ", 2)
+_BUF_SIZE = 2048  # Request buffer, allocated once and reused
+_RECV_TIMEOUT_S = 2
+# The only headers that are decoded; everything else is skipped in place
+_HEADERS = ("content-length", "content-type", "x-api-key", "connection", "upgrade", "idempotency-key")
+_HEADER_LENS = set(len(h) for h in _HEADERS)
 
-    path = target
-    query = ""
-    if "?" in target:
-        path, query = target.split("?", 1)
+
+def _recv_into(conn, mv):
+    if hasattr(conn, "recv_into"):
+        return conn.recv_into(mv)
+    data = conn.recv(len(mv))  # Port without recv_into: one small copy
+    mv[:len(data)] = data
+    return len(data)
+
+
+def _scan(buf, sub: bytes, start: int, end: int) -> int:
+    """bytearray.find for ports whose bytearray has no find()."""
+    first = sub[0]
+    k = len(sub)
+    for i in range(start, end - k + 1):
+        if buf[i] == first and buf[i:i + k] == sub:
+            return i
+    return -1
+
+
+def _find(buf, sub: bytes, start: int, end: int) -> int:
+    if hasattr(buf, "find"):
+        return buf.find(sub, start, end)
+    return _scan(buf, sub, start, end)
+
+
+def _parse_head(buf, mv, end: int):
+    """Parse request line and headers of buf[:end] (end = blank line).
+
+    Works on offsets; only method, path, query and the _HEADERS values are
+    decoded. Returns (method, path, query, headers) or None.
+    """
+    eol = _find(buf, b"\r\n", 0, end + 2)
+    sp1 = _find(buf, b" ", 0, eol)
+    sp2 = _find(buf, b" ", sp1 + 1, eol)
+    if sp1 <= 0 or sp2 < 0:
+        return None
+    method = bytes(mv[:sp1]).decode()
+    q = _find(buf, b"?", sp1 + 1, sp2)
+    if q < 0:
+        path = bytes(mv[sp1 + 1:sp2]).decode()
+        query = ""
+    else:
+        path = bytes(mv[sp1 + 1:q]).decode()
+        query = bytes(mv[q + 1:sp2]).decode()
 
     headers = {}
-    idx = 1
-    while idx < len(lines) and lines[idx]:
-        if ":" in lines[idx]:
-            k, v = lines[idx].split(":", 1)
-            headers[k.strip().lower()] = v.strip()
-        idx += 1
+    pos = eol + 2
+    while pos < end:
+        eol = _find(buf, b"\r\n", pos, end + 2)
+        if eol < 0:
+            eol = end
+        colon = _find(buf, b":", pos, eol)
+        if colon > pos and (colon - pos) in _HEADER_LENS:
+            name = bytes(mv[pos:colon]).decode().lower()
+            if name in _HEADERS:
+                start = colon + 1
+                while start < eol and buf[start] == 0x20:
+                    start += 1
+                headers[name] = bytes(mv[start:eol]).decode().strip()
+        pos = eol + 2
+    return method, path, query, headers
+
+
+def _read_request(conn, buf, mv):
+    """Receive one request into buf.
 
-    body = "\r\n".join(lines[idx + 1:]) if idx + 1 < len(lines) else ""
-    return method, path, query, headers, body
+    Returns (method, path, query, headers, body) with body a memoryview into
+    buf (valid until the next request), or None for a malformed request.
+    The body is read up to content-length, as far as buf holds it.
+    """
+    n = 0
+    end = -1
+    need = len(buf)
+    head = None
+    while n < need:
+        got = _recv_into(conn, mv[n:])
+        if not got:
+            break
+        n += got
+        if end < 0:
+            end = _find(buf, b"\r\n\r\n", max(0, n - got - 3), n)
+            if end < 0:
+                continue
+            head = _parse_head(buf, mv, end)
+            if head is None:
+                return None
+            try:
+                length = int(head[3].get("content-length") or 0)
+            except ValueError:
+                return None
+            need = min(len(buf), end + 4 + max(0, length))
+    if head is None:
+        return None
+    return head + (mv[end + 4:n],)
 
 
 def _parse_query(query: str):
@@ -50,8 +130,12 @@ def _auth_ok(headers: dict, query_params: dict, expected_key: str | None):
 
 
 class Request:
-    def __init__(self, method, path, params, headers, body):
+    """A parsed request; body_raw is a memoryview into the shared receive
+    buffer and must not be kept beyond the handler call."""
+
+    def __init__(self, method, path, params, headers, body, client=None):
         self.method = method
+        self.client = client  # Peer IP (admission control)
         self.path = path
         self.params = params
         self.headers = headers
@@ -59,41 +143,105 @@ class Request:
         self.json = None
         if body and headers.get("content-type", "").startswith("application/json"):
             try:
-                self.json = json.loads(body)
+                self.json = json.loads(bytes(body))
             except ValueError:
                 self.json = None
 
 
+# Context entries exposing tick(), advanced once per server loop pass.
+# Services may expose next_due_ms() (ms until they need a tick, or None when
+# idle) so the loop can wait in accept() exactly until the next deadline.
+_SERVICES = ("timers", "core1", "executor", "coalescer", "holds", "streams", "learn", "listener", "storage", "devices", "macros")
+_IDLE_WAIT_MS = 1000
+_POLL_WAIT_MS = 200  # For services without next_due_ms()
+
+
+def _tick_services(context):
+    if not context:
+        return
+    for key in _SERVICES:
+        svc = context.get(key)
+        if svc is None:
+            continue
+        try:
+            svc.tick()
+        except Exception as e:
+            print("Tick error (%s):" % key, e)
+
+
+def _next_wait_ms(context):
+    wait = _IDLE_WAIT_MS
+    if not context:
+        return wait
+    for key in _SERVICES:
+        svc = context.get(key)
+        if svc is None:
+            continue
+        try:
+            due = svc.next_due_ms() if hasattr(svc, "next_due_ms") else _POLL_WAIT_MS
+        except Exception:
+            due = _POLL_WAIT_MS
+        if due is not None and due < wait:
+            wait = due
+    return max(0, int(wait))
+
+
 def serve(port: int, router, api_key: str | None, context):
     addr = socket.getaddrinfo("0.0.0.0", port)[0][-1]
     s = socket.socket()
     s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     s.bind(addr)
     s.listen(1)
-    try:
-        s.settimeout(0.2)
-    except Exception:
-        pass
     print("Webserver listening on port", port)
     print("-" * 20)
 
+    stats = context.get("sched_stats") if context else None
+    buf = bytearray(_BUF_SIZE)
+    mv = memoryview(buf)
+    # The UDP remote socket (if any) is polled together with the listener
+    udp = context.get("udp") if context else None
+    poller = None
+    if udp is not None and udp.sock is not None:
+        poller = select.poll()
+        poller.register(s, select.POLLIN)
+        poller.register(udp.sock, select.POLLIN)
     try:
         while True:
-            # Periodic timers tick (non-blocking)
+            # Periodic service ticks (timers, action steps, learning, IR listener, deferred writes, journal compaction)
+            _tick_services(context)
+            wait = max(1, _next_wait_ms(context))
+            planned = mono_ms() + wait
+            if poller is not None:
+                # Wait for either socket; datagrams are handled right away
+                ready = [ev[0] for ev in poller.poll(wait)]
+                if not ready and stats is not None:
+                    # Woke up for the deadline: how late
+                    stats.loop_lag.add(max(0, mono_ms() - planned))
+                if udp.sock in ready:
+                    udp.tick()
+                if s not in ready:
+                    continue
             try:
-                tm = context.get("timers") if context else None
-                if tm:
-                    tm.tick()
-            except Exception as e:
-                print("Timer tick error:", e)
+                # Sleep in accept() until the next service deadline
+                s.settimeout(wait / 1000)
+            except Exception:
+                pass
+            conn = None
             try:
-                conn, _ = s.accept()
-                raw = conn.recv(2048).decode("utf-8")
-                method, path, query, headers, body = _parse_request(raw)
-                if method is None:
+                conn, peer = s.accept()
+            except OSError:
+                # Timed out at the deadline (EAGAIN/ETIMEDOUT): how late
+                if poller is None and stats is not None:
+                    stats.loop_lag.add(max(0, mono_ms() - planned))
+                continue
+            try:
+                conn.settimeout(_RECV_TIMEOUT_S)
+                parsed = _read_request(conn, buf, mv)
+                if parsed is None:
                     json_response(conn, 400, {"error": "Bad request"})
                     conn.close()
                     continue
+                method, path, query, headers, body = parsed
 
                 params = _parse_query(query)
                 if not _auth_ok(headers, params, api_key):
@@ -106,7 +254,7 @@ def serve(port: int, router, api_key: str | None, context):
                     conn.close()
                     continue
 
-                req = Request(method, path, params, headers, body)
+                req = Request(method, path, params, headers, body, peer[0] if peer else None)
 
                 handler = router.get((method, path)) or router.get(("*", path))
                 if not handler:
@@ -114,8 +262,26 @@ def serve(port: int, router, api_key: str | None, context):
                     conn.close()
                     continue
 
+                # Retried request (Idempotency-Key / rid): replay the answer
+                idem = context.get("idempotency") if context else None
+                idem_key = idem.key(req) if idem is not None else None
+                if idem_key is not None:
+                    idem_fp = idem.fingerprint(req)
+                    cached = idem.get(idem_key, idem_fp)
+                    if cached is not None:
+                        json_response(conn, cached[0], cached[1], {"Idempotent-Replayed": "true"} if cached[0] != 422 else None)
+                        conn.close()
+                        continue
+
                 try:
                     status, payload = handler(context, req)
+                    if idem_key is not None:
+                        idem.put(idem_key, status, payload, idem_fp)
+                    if hasattr(payload, "poll"):
+                        # Streamed response: the connection stays open
+                        context["streams"].open(conn, status, payload)
+                        conn = None
+                        continue
                     json_response(conn, status, payload)
                 except Exception as e:
                     print("Handler error:", e)
@@ -123,22 +289,23 @@ def serve(port: int, router, api_key: str | None, context):
 
                 conn.close()
             except Exception as e:
-                # Accept timeout (no incoming connection) or handler error
+                # Connection or handler error
                 try:
                     # When timeout occurs, conn may not exist
-                    if 'conn' in locals():
+                    if conn is not None:
                         conn.close()
                 except Exception:
                     pass
-                # Ignore timeouts (EAGAIN/EWOULDBLOCK)
-                if isinstance(e, OSError):
-                    # Shallow yield
-                    try:
-                        time.sleep_ms(10)
-                    except Exception:
-                        pass
-                else:
+                # Ignore socket timeouts and resets of the client
+                if not isinstance(e, OSError):
                     print("Request error:", e)
     finally:
         s.close()
         print("Webserver socket closed.")
+        if context and context.get("streams") is not None:
+            context["streams"].close_all()
+        if udp is not None:
+            udp.stop()
+        if context and context.get("core1") is not None:
+            context["core1"].stop()
+        flush_writes()
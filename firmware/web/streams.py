@@ -0,0 +1,65 @@
+from .responses import chunked_start, send_chunk, chunked_end
+
+
+class StreamManager:
+    """Keeps streamed (chunked) responses open across server loop passes.
+
+    - A handler returns a source object (poll() -> list of JSON values,
+      pending(), done) instead of a payload; the server hands the
+      connection over with open() instead of closing it
+    - tick() writes whatever the sources produced as NDJSON chunks and
+      closes a connection once its source is done
+    - A client that went away only drops its stream; the work goes on
+    """
+
+    def __init__(self, max_streams: int = 4):
+        self._max = max(1, int(max_streams))
+        self._streams = []  # [conn, source]
+
+    def full(self) -> bool:
+        return len(self._streams) >= self._max
+
+    def open(self, conn, status: int, source):
+        chunked_start(conn, status)
+        self._streams.append([conn, source])
+        self._write(self._streams[-1])
+
+    def _write(self, entry):
+        conn, source = entry
+        try:
+            for value in source.poll():
+                send_chunk(conn, value)
+            if source.done:
+                chunked_end(conn)
+        except Exception as e:
+            print("[streams] client gone:", e)
+            source = None
+        if source is None or source.done:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._streams.remove(entry)
+
+    def next_due_ms(self):
+        for _, source in self._streams:
+            if source.pending() or source.done:
+                return 0
+        return None
+
+    def tick(self):
+        for entry in list(self._streams):
+            if entry[1].pending() or entry[1].done:
+                self._write(entry)
+
+    def close_all(self):
+        for conn, _ in self._streams:
+            try:
+                chunked_end(conn)
+                conn.close()
+            except Exception:
+                pass
+        self._streams = []
+
+    def count(self) -> int:
+        return len(self._streams)
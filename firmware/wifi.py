@@ -1,11 +1,129 @@
 import time
 
+try:
+    import ubinascii as binascii  # MicroPython
+except ImportError:
+    import binascii
 
-def connect(wlan, ssid: str, password: str, status_led=None, timeout_s: int = 15):
+from storage import read_json, write_json_atomic
+
+_POLL_MS = 50  # Status poll interval while associating
+_STAT_GOT_IP = 3
+
+
+def _ms():
+    return time.ticks_ms()
+
+
+def _blink(status_led):
+    if status_led is not None:
+        try:
+            status_led.toggle()
+        except Exception:
+            pass
+
+
+def _wait(wlan, timeout_ms: int, status_led=None):
+    """Poll the link status every _POLL_MS; returns the final status."""
+    start = _ms()
+    last = None
+    blink = start
+    while True:
+        st = wlan.status()
+        if st != last:
+            print("Wi-Fi status:", st)
+            last = st
+        if st < 0 or st >= _STAT_GOT_IP:
+            return st
+        now = _ms()
+        if time.ticks_diff(now, start) >= timeout_ms:
+            return st
+        if time.ticks_diff(now, blink) >= 500:
+            _blink(status_led)
+            blink = now
+        time.sleep(_POLL_MS / 1000)
+
+
+def _join(wlan, ssid: str, password: str, bssid=None):
+    if bssid:
+        try:
+            wlan.connect(ssid, password, bssid=bssid)
+            return
+        except TypeError:
+            pass  # Port without the bssid argument
+    wlan.connect(ssid, password)
+
+
+def _best_ap(wlan, ssid: str):
+    """BSSID of the strongest access point for ssid, or None."""
+    best = None
+    try:
+        networks = wlan.scan()
+    except Exception as e:
+        print("Wi-Fi scan failed:", e)
+        return None
+    print("Scanned for Wi-Fi networks:", len(networks), "found")
+    for net in networks:
+        if net[0].decode() == ssid and (best is None or net[3] > best[3]):
+            best = net
+    return best[1] if best is not None else None
+
+
+def _load_cache(cache_file, ssid: str):
+    if not cache_file:
+        return None
+    cache = read_json(cache_file, None)
+    if not isinstance(cache, dict) or cache.get("ssid") != ssid or not cache.get("bssid"):
+        return None
+    return cache
+
+
+def _save_cache(cache_file, cache, ssid: str, bssid, ifconfig, reused: int):
+    if not cache_file:
+        return
+    entry = {
+        "ssid": ssid,
+        "bssid": binascii.hexlify(bssid).decode() if bssid else None,
+        "ifconfig": list(ifconfig),  # As handed out by DHCP
+        "reused": reused,  # Boots on the cached address since that lease
+    }
+    if entry != cache:  # Only write when something changed (flash wear)
+        try:
+            write_json_atomic(cache_file, entry)
+        except Exception as e:
+            print("Wi-Fi cache not saved:", e)
+
+
+def connect(
+    wlan,
+    ssid: str,
+    password: str,
+    status_led=None,
+    timeout_s: int = 15,
+    cache_file: str = None,
+    fast_timeout_ms: int = 3000,
+    reuse_ip: bool = False,
+    reuse_boots: int = 3,
+    report: dict = None,
+):
     """Connect to Wi-Fi, optionally blinking a status LED while waiting.
 
+    - With cache_file, the last good BSSID and the IP configuration DHCP
+      handed out are kept in flash; the next boot joins that access point
+      directly (no scan)
+    - With reuse_ip the cached address is also taken as a static one
+      instead of waiting for DHCP, for at most reuse_boots boots in a row:
+      the lease time is unknown here, so the boot after that runs DHCP
+      again and renews the lease
+    - The fast path gets fast_timeout_ms; after that (or without a cache)
+      one scan picks the strongest access point and DHCP runs as usual
+    - report (a dict) receives the path taken ("cached"/"scan") and the
+      time spent in each
+
     Returns the IP address on success; raises RuntimeError on failure.
     """
+    if report is None:
+        report = {}
     wlan.active(True)
     try:
         # Disable power save if available (Pico W specific)
@@ -13,30 +131,44 @@ def connect(wlan, ssid: str, password: str, status_led=None, timeout_s: int = 15
     except Exception:
         pass
 
-    wlan.scan()  # Trigger scan to populate known networks
-    time.sleep(1)
-    print("Scanned for Wi-Fi networks")
-    print("Available networks:")
-    networks = wlan.scan()
-    for net in networks:
-        print(" -", net[0].decode())
-    time.sleep(1)
-    wlan.connect(ssid, password)
-    max_wait = timeout_s
-    while max_wait > 0:
-        st = wlan.status()
-        print("Wi-Fi status:", st)
-        if st < 0 or st >= 3:
-            break
-        max_wait -= 1
-        if status_led is not None:
+    cache = _load_cache(cache_file, ssid)
+    st = None
+    bssid = None
+    static = False
+    if cache is not None:
+        start = _ms()
+        static = bool(reuse_ip and cache.get("ifconfig") and int(cache.get("reused") or 0) < reuse_boots)
+        try:
+            if static:
+                wlan.ifconfig(tuple(cache["ifconfig"]))
+            bssid = binascii.unhexlify(cache["bssid"])
+            _join(wlan, ssid, password, bssid)
+            st = _wait(wlan, fast_timeout_ms, status_led)
+        except Exception as e:
+            print("Wi-Fi fast connect failed:", e)
+        report["cached_ms"] = time.ticks_diff(_ms(), start)
+        if st == _STAT_GOT_IP:
+            report["path"] = "cached"
+        else:
+            print("Cached access point not reachable, scanning")
+            bssid = None
             try:
-                status_led.toggle()
+                wlan.disconnect()
+                if static:
+                    wlan.ifconfig("dhcp")
             except Exception:
                 pass
-        time.sleep(1)
+            static = False
+
+    if st != _STAT_GOT_IP:
+        start = _ms()
+        bssid = _best_ap(wlan, ssid)
+        _join(wlan, ssid, password, bssid)
+        st = _wait(wlan, timeout_s * 1000, status_led)
+        report["scan_ms"] = time.ticks_diff(_ms(), start)
+        report["path"] = "scan"
 
-    if wlan.status() != 3:
+    if wlan.status() != _STAT_GOT_IP:
         raise RuntimeError("Wi-Fi connection failed")
 
     if status_led is not None:
@@ -45,5 +177,11 @@ def connect(wlan, ssid: str, password: str, status_led=None, timeout_s: int = 15
         except Exception:
             pass
 
-    ip_address = wlan.ifconfig()[0]
-    return ip_address
+    ifconfig = wlan.ifconfig()
+    report["static_ip"] = static
+    if static:
+        # Keep the DHCP configuration, only count the reuse
+        _save_cache(cache_file, cache, ssid, bssid, cache["ifconfig"], int(cache.get("reused") or 0) + 1)
+    else:
+        _save_cache(cache_file, cache, ssid, bssid, ifconfig, 0)
+    return ifconfig[0]